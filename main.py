@@ -1,47 +1,351 @@
 import argparse
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from src.utils import load_questions_config
-from src.categoriser import run_categorisation_for_question
+from src.utils import load_questions_config, atomic_save_df, load_table, read_columns, table_format
+from src.categoriser import run_categorisation_for_question, get_or_create_codes_column, get_or_create_provenance_column
+from src.categories_cache import CACHE_FILE, CategoriesCache
+from src.api_client import POOL_SIZE, configure_client
+from src.progress import ProgressBoard
+from src.preclassify import PreClassifier
+from src.metrics import Metrics
+from src.response_cache import RESPONSE_CACHE_FILE, ResponseCache
+from src.checkpoint import CheckpointJournal, replay_journal
+from src.streaming import stream_code_csv
+from src.sharding import id_dtype, load_shard, merge_shards, parse_shard, shard_path
 
 def parse_args():
     ap = argparse.ArgumentParser(description="Batch-categorise survey responses with Pandas + LLM API.")
-    ap.add_argument("--input", required=True, help="Path to input CSV/Excel.")
-    ap.add_argument("--output", required=True, help="Path to output CSV (will be overwritten atomically).")
+    ap.add_argument("--input", required=True, help="Path to input CSV/Excel/Parquet/Feather.")
+    ap.add_argument("--output", required=True,
+                    help="Path to output file, format from the extension: .csv/.xlsx/.parquet/.feather (overwritten atomically).")
     ap.add_argument("--config", required=True, help="Path to questions_config.json.")
+    ap.add_argument("--project-columns", action="store_true",
+                    help="Load only the configured question columns (plus --id-col and existing [Codes]/[Provenance] columns); "
+                         "the output then holds just those.")
+    ap.add_argument("--id-col", default=None,
+                    help="Respondent ID column: kept with --project-columns, and hashed to split rows with --shard.")
+    ap.add_argument("--shard", default=None, metavar="i/N",
+                    help="Code only shard i of N (0-based): rows picked by a hash of --id-col (or row number). "
+                         "Writes <output>.shard-i-of-N.<ext> with its own journal and caches.")
+    ap.add_argument("--merge-shards", type=int, default=0, metavar="N",
+                    help="Combine the N shard outputs of --output into --output, union their label and "
+                         "response caches, and exit.")
     ap.add_argument("--model", default="azure~openai.gpt-4o-mini", help="LLM model id for the API.")
     ap.add_argument("--batch-size", type=int, default=1, help="How many rows to send per request (default 1).")
+    ap.add_argument("--batch-token-budget", type=int, default=0,
+                    help="Pack batches up to this many estimated prompt tokens and adapt their size "
+                         "(--batch-size becomes the max rows per request). 0 = fixed batches.")
+    ap.add_argument("--concurrency", type=int, default=1, help="How many requests to keep in flight per question (default 1).")
+    ap.add_argument("--parallel-questions", type=int, default=1, help="How many question columns to code at once (default 1).")
+    ap.add_argument("--pool-size", type=int, default=None,
+                    help="Max pooled HTTP connections (default: max(AIBOTS_POOL_SIZE, --concurrency x --parallel-questions)).")
+    ap.add_argument("--max-in-flight", type=int, default=None,
+                    help="Global cap on concurrent API requests across all questions (default: AIBOTS_MAX_IN_FLIGHT, 0 = none).")
+    ap.add_argument("--rpm", type=float, default=None, help="Client-side cap on API requests per minute (default: AIBOTS_RPM, 0 = none).")
+    ap.add_argument("--tpm", type=float, default=None, help="Client-side cap on estimated tokens per minute (default: AIBOTS_TPM, 0 = none).")
+    ap.add_argument("--response-cache", default=RESPONSE_CACHE_FILE, help=f"SQLite file caching coded answers (default {RESPONSE_CACHE_FILE}).")
+    ap.add_argument("--response-cache-max", type=int, default=200_000, help="Max cached answers before LRU eviction.")
+    ap.add_argument("--no-response-cache", action="store_true", help="Always send answers to the API.")
+    ap.add_argument("--categories-cache", default=CACHE_FILE,
+                    help=f"JSON file of labels found per question, shared between runs (default {CACHE_FILE}).")
+    ap.add_argument("--categories-flush", type=float, default=5.0,
+                    help="Seconds between writes of the categories cache during a run (default 5); it is always written at the end.")
+    ap.add_argument("--no-preclassify", action="store_true",
+                    help="Send every answer to the API (skip local NIL / exact / fuzzy label matching).")
+    ap.add_argument("--cluster-threshold", type=float, default=0.0,
+                    help="Group near-paraphrase answers (TF-IDF cosine >= this, e.g. 0.85) and send one per group; "
+                         "the rest take its codes. 0 = off.")
+    ap.add_argument("--compact-prompts", action="store_true",
+                    help="Send the instruction and label list once per chat, then only answers and new labels.")
+    ap.add_argument("--max-context-tokens", type=int, default=16000,
+                    help="With --compact-prompts, start a fresh chat once a conversation passes this many tokens (default 16000).")
+    ap.add_argument("--stream-responses", action="store_true",
+                    help="With --batch-size > 1, stream each reply (streaming=true) and store every row's codes "
+                         "as soon as its result arrives.")
+    ap.add_argument("--fuzzy-cutoff", type=float, default=0.9,
+                    help="Similarity (0-1) an answer needs to a known label to be coded locally (default 0.9).")
+    ap.add_argument("--checkpoint", default=None, help="Checkpoint journal path (default: <output>.journal.jsonl).")
+    ap.add_argument("--checkpoint-sync", type=float, default=5.0, help="Seconds between fsyncs of the journal (default 5).")
+    ap.add_argument("--no-checkpoint", action="store_true", help="Rewrite the whole output CSV after every pass instead.")
+    ap.add_argument("--materialise", action="store_true", help="Replay the journal onto --input, save --output and exit.")
+    ap.add_argument("--stream-chunksize", type=int, default=0,
+                    help="Stream a large CSV in chunks of this many rows, appending each coded chunk to --output "
+                         "(which must differ from --input). 0 = load the whole file.")
+    ap.add_argument("--max-retries", type=int, default=3, help="Retries per request, with exponential backoff + jitter (default 3).")
+    ap.add_argument("--max-row-attempts", type=int, default=3, help="Failed attempts before a row is marked #QUARANTINED (default 3).")
+    ap.add_argument("--max-pass-aborts", type=int, default=6,
+                    help="Passes in a row aborted by throttling/outages before a question's remaining rows are left "
+                         "blank for the next run (default 6).")
+    ap.add_argument("--retry-quarantined", action="store_true", help="Try rows marked #QUARANTINED again.")
+    ap.add_argument("--recode", choices=["stale"], default=None,
+                    help="'stale': recode rows whose [Provenance] (instruction + model + labels_version) "
+                         "no longer matches the config.")
+    ap.add_argument("--recode-label", action="append", default=[], metavar="LABEL",
+                    help="Recode rows carrying this label (case-insensitive); repeatable. "
+                         "The label is dropped from the known labels for that question.")
     ap.add_argument("--no-verbose", action="store_true", help="Disable per-row console logs.")
+    ap.add_argument("--progress", action="store_true", help="Show a live progress bar with rate and ETA instead of per-row logs.")
+    ap.add_argument("--report", default=None, help="Run report JSON with stage timings and counters (default: <output>.report.json).")
     return ap.parse_args()
 
-def load_df(path: str) -> pd.DataFrame:
-    if path.lower().endswith((".xlsx", ".xls")):
-        return pd.read_excel(path)
-    return pd.read_csv(path)
+def projected_columns(header: list[str], specs: list[dict], id_col: str | None) -> list[str]:
+    """Input columns a run needs: the ID column, each question and its [Codes]/[Provenance] columns if present."""
+    wanted = set()
+    if id_col:
+        if id_col not in header:
+            raise SystemExit(f"--id-col {id_col!r} is not a column of the input.")
+        wanted.add(id_col)
+    for spec in specs:
+        wanted.update((spec["question_col"], f"{spec['question_col']} [Codes]", f"{spec['question_col']} [Provenance]"))
+    return [c for c in header if c in wanted]   # keep the file's column order
+
+def make_preclassifier(spec: dict, args) -> PreClassifier | None:
+    if args.no_preclassify:
+        return None
+    return PreClassifier.for_instruction(spec["instruction"], fuzzy_cutoff=args.fuzzy_cutoff)
+
+def code_questions(df: pd.DataFrame, specs: list[dict], args, common: dict, *, output_path: str | None):
+    """Run every configured question over df, one after another or --parallel-questions at a time."""
+    journal = common["journal"]
+    if args.parallel_questions <= 1:
+        board = ProgressBoard() if args.progress else None
+        for spec in specs:
+            q_col = spec["question_col"]
+            say = board.logger(q_col) if board else print
+            say(f"→ Processing: {q_col}")
+            new_col = run_categorisation_for_question(
+                df,
+                q_col,
+                spec["instruction"],
+                output_path=None if journal else output_path,
+                autosave_every_pass=journal is None,
+                verbose=not args.no_verbose and board is None,
+                preclassifier=make_preclassifier(spec, args),
+                labels_version=str(spec.get("labels_version", "")),
+                progress=board.reporter(q_col) if board else None,
+                log=say,
+                **common,
+            )
+            say(f"   Created/filled: {new_col}")
+        if board:
+            board.close()
+        return
+
+    # every [Codes] column exists before any worker starts, so no insert can
+    # shift a column position out from under another question's writes
+    for spec in specs:
+        codes_col, _, _ = get_or_create_codes_column(df, spec["question_col"])
+        get_or_create_provenance_column(df, spec["question_col"], codes_col)
+
+    print(f"→ Processing {len(specs)} questions, {args.parallel_questions} at a time")
+    df_lock = threading.Lock()
+    board = ProgressBoard()
+    with ThreadPoolExecutor(max_workers=args.parallel_questions) as pool:
+        futures = {
+            pool.submit(
+                run_categorisation_for_question,
+                df,
+                spec["question_col"],
+                spec["instruction"],
+                output_path=None,
+                autosave_every_pass=False,
+                verbose=False,
+                preclassifier=make_preclassifier(spec, args),
+                labels_version=str(spec.get("labels_version", "")),
+                df_lock=df_lock,
+                progress=board.reporter(spec["question_col"]),
+                log=board.logger(spec["question_col"]),
+                **common,
+            ): spec["question_col"]
+            for spec in specs
+        }
+        for fut in as_completed(futures):
+            board.logger(futures[fut])(f"Created/filled: {fut.result()}")
+    board.close()
 
 if __name__ == "__main__":
     args = parse_args()
-    df = load_df(args.input)
+    args.parallel_questions = max(1, args.parallel_questions)
+    metrics = Metrics()
+    client_opts = {
+        "pool_size": args.pool_size or max(POOL_SIZE, args.concurrency * args.parallel_questions),
+        "metrics": metrics,
+    }
+    for opt in ("max_in_flight", "rpm", "tpm"):
+        if getattr(args, opt) is not None:
+            client_opts[opt] = getattr(args, opt)
+    client = configure_client(**client_opts)
     q_specs = load_questions_config(args.config)
+    categories_cache = args.categories_cache
+    streaming = args.stream_chunksize > 0
+
+    load_cols = None
+    if args.project_columns:
+        if os.path.realpath(args.output) == os.path.realpath(args.input):
+            raise SystemExit("--project-columns saves only the loaded columns, so writing over --input would drop the "
+                             "rest of the survey; pick a different --output.")
+        load_cols = projected_columns(read_columns(args.input), q_specs, args.id_col)
+
+    if (args.shard or args.merge_shards) and args.id_col and args.id_col not in read_columns(args.input):
+        raise SystemExit(f"--id-col {args.id_col!r} is not a column of the input.")
+
+    if args.merge_shards:
+        df = load_table(args.input, columns=load_cols, dtype=id_dtype(args.id_col))
+        merge_cache = None if args.no_response_cache else ResponseCache(args.response_cache, max_entries=args.response_cache_max)
+        specs = [spec for spec in q_specs if spec["question_col"] in df.columns]
+        print(f"→ Merging {args.merge_shards} shards of {args.output}")
+        try:
+            renamed = merge_shards(df, specs, args.output, args.merge_shards, id_col=args.id_col,
+                                   categories_cache=categories_cache, response_cache=merge_cache)
+        except (FileNotFoundError, ValueError) as e:
+            raise SystemExit(f"❌ {e}")
+        if merge_cache is not None:
+            merge_cache.close()
+        atomic_save_df(df, args.output)
+        print(f"✅ Merged {len(df)} rows into {args.output} ({renamed} label spellings reconciled)")
+        raise SystemExit(0)
+
+    shard = None
+    if args.shard:
+        if streaming:
+            raise SystemExit("--shard loads only its own rows already; drop --stream-chunksize.")
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        # every file a worker writes gets the shard suffix, so workers never share one
+        args.output = shard_path(args.output, *shard)
+        if args.checkpoint:
+            args.checkpoint = shard_path(args.checkpoint, *shard)
+        main_response_cache = args.response_cache
+        args.response_cache = shard_path(args.response_cache, *shard)
+        categories_cache = shard_path(args.categories_cache, *shard)
+        if not os.path.exists(categories_cache) and os.path.exists(args.categories_cache):
+            shutil.copyfile(args.categories_cache, categories_cache)   # start from the labels already agreed on
+        print(f"→ Shard {shard[0]}/{shard[1]} → {args.output}")
+
+    journal_path = args.checkpoint or f"{args.output}.journal.jsonl"
 
+    if streaming:
+        if table_format(args.input) not in ("csv", "parquet"):
+            raise SystemExit("--stream-chunksize needs a CSV or Parquet input.")
+        if table_format(args.output) != "csv":
+            raise SystemExit("--stream-chunksize appends to --output, so it must be a .csv file.")
+        columns = load_cols or read_columns(args.input)
+    elif shard is not None:
+        df = load_shard(args.input, *shard, id_col=args.id_col, columns=load_cols)
+        columns = df.columns
+    else:
+        df = load_table(args.input, columns=load_cols, dtype=id_dtype(args.id_col))
+        columns = df.columns
+
+    journal = None
+    if not streaming and not args.no_checkpoint:
+        restored = replay_journal(df, journal_path)
+        if restored:
+            print(f"↺ Restored {restored} coded rows from {journal_path}")
+        if args.materialise:
+            atomic_save_df(df, args.output)
+            print(f"✅ Materialised checkpoint to {args.output}")
+            raise SystemExit(0)
+        journal = CheckpointJournal(journal_path, sync_interval=args.checkpoint_sync)
+
+    response_cache = None
+    if not args.no_response_cache:
+        response_cache = ResponseCache(args.response_cache, max_entries=args.response_cache_max)
+        if shard is not None:
+            # the main cache is read once into this worker's own file, so no two processes write one sqlite file
+            added = response_cache.merge_from(main_response_cache)
+            if added:
+                print(f"   Response cache: {added} answers copied from {main_response_cache}")
+
+    specs = []
     for spec in q_specs:
-        q_col = spec["question_col"]
-        instr = spec["instruction"]
-        if q_col not in df.columns:
-            print(f"⚠️  Skipping missing column: {q_col}")
+        if spec["question_col"] not in columns:
+            print(f"⚠️  Skipping missing column: {spec['question_col']}")
             continue
+        specs.append(spec)
+
+    try:
+        cat_store = CategoriesCache(categories_cache, flush_interval=args.categories_flush)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+
+    common = dict(
+        model=args.model,
+        batch_size=max(1, args.batch_size),
+        concurrency=max(1, args.concurrency),
+        response_cache=response_cache,
+        journal=journal,
+        batch_token_budget=max(0, args.batch_token_budget),
+        max_retries=max(0, args.max_retries),
+        max_row_attempts=max(1, args.max_row_attempts),
+        max_pass_aborts=max(1, args.max_pass_aborts),
+        retry_quarantined=args.retry_quarantined,
+        recode_stale=args.recode == "stale",
+        recode_labels=args.recode_label or None,
+        cluster_threshold=max(0.0, args.cluster_threshold),
+        compact_prompts=args.compact_prompts,
+        max_context_tokens=max(1000, args.max_context_tokens),
+        metrics=metrics,
+        categories_cache=cat_store,
+        stream_responses=args.stream_responses,
+    )
 
-        print(f"→ Processing: {q_col}")
-        new_col = run_categorisation_for_question(
-            df,
-            q_col,
-            instr,
-            model=args.model,
-            output_path=args.output,
-            autosave_every_pass=True,
-            batch_size=max(1, args.batch_size),
-            verbose=not args.no_verbose,
+    if streaming:
+        def _code_chunk(chunk: pd.DataFrame, chunk_journal: CheckpointJournal, row_offset: int):
+            code_questions(chunk, specs, args, {**common, "journal": chunk_journal, "journal_row_offset": row_offset},
+                           output_path=None)
+
+        rows = stream_code_csv(
+            args.input,
+            args.output,
+            chunksize=args.stream_chunksize,
+            code_chunk=_code_chunk,
+            journal_path=journal_path,
+            sync_interval=args.checkpoint_sync,
+            columns=load_cols,
+            dtype=id_dtype(args.id_col),
         )
-        print(f"   Created/filled: {new_col}")
+    else:
+        if args.parallel_questions > 1 and journal is None:
+            print("⚠️  --parallel-questions saves only at the end; without a checkpoint journal a crash loses progress.")
+        code_questions(df, specs, args, common, output_path=args.output)
+
+    cache_stats = None
+    if response_cache is not None:
+        st = cache_stats = response_cache.stats()
+        # counted per distinct answer looked up; the per-question lines count rows (duplicates included)
+        print(f"   Response cache overall: {st['hits']}/{st['hits'] + st['misses']} distinct answers found "
+              f"({st['hit_rate'] * 100:.1f}%)")
+        response_cache.close()
+
+    lm = client.limiter.metrics()
+    print(f"   Rate limiter: {lm['requests']} requests, {lm['throttled']} throttled (429), "
+          f"{lm['server_errors']} server errors, {lm['wait_seconds']:.1f}s waiting, "
+          f"concurrency window {lm['concurrency_limit']}/{lm['max_concurrency']}")
+
+    if streaming:
+        print(f"✅ Done. Streamed {rows} rows to {args.output}")
+    else:
+        with metrics.timer("output_save"):
+            atomic_save_df(df, args.output)
+        if journal is not None:
+            journal.close(remove=True)   # everything is in the output now
+        print(f"✅ Done. Saved to {args.output}")
 
-    df.to_csv(args.output, index=False)
-    print(f"✅ Done. Saved to {args.output}")
+    report_path = args.report or f"{args.output}.report.json"
+    rep = metrics.write_report(report_path, extra={
+        "input": args.input,
+        "output": args.output,
+        "options": vars(args),
+        "rate_limiter": lm,
+        "response_cache": cache_stats,
+    })
+    net = rep["stages"].get("network")
+    print(f"   {rep['rows_coded']} rows in {rep['elapsed_s']:.1f}s ({rep['rows_per_sec']} rows/s)"
+          + (f", API p50/p95/p99 {net['p50_ms']:.0f}/{net['p95_ms']:.0f}/{net['p99_ms']:.0f} ms" if net else "")
+          + f" — report: {report_path}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Per-request latency of the old one-shot `requests.post` calls vs the pooled
+AIBotsClient, against the local mock server.
+
+    python scripts/bench_api_client.py --n 300
+    python scripts/bench_api_client.py --n 300 --multipart-only
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.api_client import AIBotsClient            # noqa: E402
+from mock_aibots_server import MockAIBotsServer    # noqa: E402
+
+def legacy_send(base: str, chat_id: str, text: str) -> dict:
+    """What send_message did before pooling: fresh connection, JSON first, then multipart."""
+    url = f"{base}/v1.0/api/chats/{chat_id}/messages"
+    qp = {"streaming": "false", "cloak": "true"}
+    r = requests.post(url, json={"content": text}, timeout=60, params=qp)
+    if r.status_code in (200, 201):
+        return r.json()
+    r = requests.post(url, files={"content": (None, text)}, timeout=60, params=qp)
+    r.raise_for_status()
+    return r.json()
+
+def timed(fn, n: int) -> list[float]:
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+def report(name: str, ms: list[float]):
+    print(f"{name:<10} mean {statistics.mean(ms):7.3f} ms   p50 {statistics.median(ms):7.3f} ms   "
+          f"p95 {sorted(ms)[int(len(ms) * 0.95) - 1]:7.3f} ms")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pooled vs one-shot API calls.")
+    ap.add_argument("--n", type=int, default=300, help="Messages per variant.")
+    ap.add_argument("--multipart-only", action="store_true", help="Stub rejects JSON bodies (exercises fallback).")
+    args = ap.parse_args()
+
+    text = json.dumps({"instructions": "x", "question": "q", "answer": "use strong passwords", "categories": []})
+    with MockAIBotsServer(multipart_only=args.multipart_only) as srv:
+        client = AIBotsClient(base_url=srv.url, version="v1.0", api_key="bench")
+        chat_id = client.create_chat()
+
+        before = srv.requests
+        legacy = timed(lambda: legacy_send(srv.url, chat_id, text), args.n)
+        legacy_http = srv.requests - before
+
+        before = srv.requests
+        pooled = timed(lambda: client.send_message(chat_id, text), args.n)
+        pooled_http = srv.requests - before
+        client.close()
+
+    report("one-shot", legacy)
+    report("pooled", pooled)
+    saved = statistics.mean(legacy) - statistics.mean(pooled)
+    print(f"saved      {saved:7.3f} ms/request ({saved / statistics.mean(legacy) * 100:.0f}%)")
+    print(f"HTTP calls one-shot {legacy_http}, pooled {pooled_http} (content mode: {client.content_mode})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+categories_cache.json before vs after the CategoriesCache store:
+  * load time for many questions x thousands of labels,
+  * cost of saving after every pass (old: re-read + indent=2 rewrite each time;
+    new: in-memory merge, debounced flush),
+  * labels kept when several processes write one cache at the same time.
+
+    python scripts/bench_categories_cache.py --questions 50 --labels 5000 --writers 8
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.categories_cache import CategoriesCache  # noqa: E402
+
+# ---- pre-change implementation, kept here for comparison ----
+def legacy_load(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def legacy_save_categories(path: str, key: str, categories: list[str]):
+    cache = legacy_load(path)
+    cache[key] = categories
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except Exception:
+        pass
+
+def _writer(args):
+    mode, path, w, n = args
+    if mode == "legacy":
+        for i in range(n):
+            cache = legacy_load(path)
+            legacy_save_categories(path, "Q", cache.get("Q", []) + [f"w{w}-{i}"])
+    else:
+        store = CategoriesCache(path, flush_interval=0)   # flush on every update: worst case for contention
+        for i in range(n):
+            store.update("Q", [f"w{w}-{i}"])
+        store.flush()
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the categories cache store.")
+    ap.add_argument("--questions", type=int, default=50)
+    ap.add_argument("--labels", type=int, default=5000, help="Labels per question.")
+    ap.add_argument("--passes", type=int, default=20, help="Saves per question (one per pass).")
+    ap.add_argument("--writers", type=int, default=8, help="Concurrent processes in the lost-update test.")
+    ap.add_argument("--labels-per-writer", type=int, default=50)
+    args = ap.parse_args()
+
+    data = {f"Question {q}": [f"Theme {q}-{i}" for i in range(args.labels)] for q in range(args.questions)}
+    with tempfile.TemporaryDirectory() as tmp:
+        old, new = os.path.join(tmp, "old.json"), os.path.join(tmp, "new.json")
+        with open(old, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        store = CategoriesCache(new, flush_interval=3600)
+        for q, labels in data.items():
+            store.update(q, labels)
+        store.flush()
+        print(f"{args.questions} questions x {args.labels} labels: "
+              f"old file {os.path.getsize(old) / 1e6:.1f} MB, new file {os.path.getsize(new) / 1e6:.1f} MB\n")
+
+        t0 = time.perf_counter()
+        for q in data:                       # the old code loaded the file once per question
+            legacy_load(old).get(q, [])
+        t_old_load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        store = CategoriesCache(new)         # one load shared by every question
+        for q in data:
+            store.get(q)
+        t_new_load = time.perf_counter() - t0
+        print(f"load all questions:   old {t_old_load:7.3f}s   new {t_new_load:7.3f}s")
+
+        qs = list(data)[:5]
+        t0 = time.perf_counter()
+        for p in range(args.passes):
+            for q in qs:
+                legacy_save_categories(old, q, data[q] + [f"new {p}"])
+        t_old_save = time.perf_counter() - t0
+        store = CategoriesCache(new, flush_interval=5.0)
+        t0 = time.perf_counter()
+        for p in range(args.passes):
+            for q in qs:
+                store.update(q, data[q] + [f"new {p}"])
+        store.flush()
+        t_new_save = time.perf_counter() - t0
+        print(f"{args.passes} passes x {len(qs)} questions saved: old {t_old_save:7.3f}s   new {t_new_save:7.3f}s")
+
+        expected = args.writers * args.labels_per_writer
+        print(f"\n{args.writers} processes each adding {args.labels_per_writer} labels to one cache:")
+        for mode in ("legacy", "store"):
+            path = os.path.join(tmp, f"race-{mode}.json")
+            with mp.Pool(args.writers) as pool:
+                pool.map(_writer, [(mode, path, w, args.labels_per_writer) for w in range(args.writers)])
+            kept = len(CategoriesCache(path).get("Q")) if mode == "store" else len(set(legacy_load(path).get("Q", [])))
+            print(f"  {mode:<7} kept {kept}/{expected} labels")
+
+if __name__ == "__main__":
+    main()
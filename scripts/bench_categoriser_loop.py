@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Per-pass bookkeeping cost of the categoriser loop, before vs after the
+vectorised blank scan / category registry / pending-row index.
+
+No API calls: this times only what a pass does besides talking to the LLM
+(has-blanks check, blank-row scan, category seeding, label membership on
+writes) on a codes column that is mostly done.
+
+    python scripts/bench_categoriser_loop.py --rows 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.categoriser import (  # noqa: E402
+    CategoryRegistry,
+    _blank_row_indices,
+    _empty,
+    _parse_labels,
+    _seed_categories_from_df,
+)
+
+LABELS = [f"Label {i}" for i in range(300)]
+
+def make_df(n: int, blank_frac: float, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, len(LABELS), n)
+    b = rng.integers(0, len(LABELS), n)
+    codes = pd.Series([f"{LABELS[i]}; {LABELS[j]}" for i, j in zip(a, b)], dtype=object)
+    codes[rng.random(n) < blank_frac] = ""
+    return pd.DataFrame({"Q": "some answer", "Q [Codes]": codes})
+
+# ---- pre-change implementation, kept here for comparison ----
+def legacy_pass(df: pd.DataFrame, idx: int, categories: list[str], writes: int):
+    any(_empty(v) for v in df.iloc[:, idx])                                 # _has_blanks()
+    seen = {}
+    for v in df.iloc[:, idx]:                                              # _seed_categories_from_df
+        for lab in _parse_labels(v):
+            seen.setdefault(lab, None)
+    for c in seen:
+        if c not in categories:
+            categories.append(c)
+    blanks = [int(i) for i in df.index if _empty(df.iat[i, idx])]         # _blank_row_indices
+    for r in blanks[:writes]:                                              # label membership on write
+        for c in ("Label 7", f"New {r}"):
+            if c not in categories:
+                categories.append(c)
+
+def current_pass(pending: dict, categories: CategoryRegistry, writes: int):
+    bool(pending)                                                          # _has_blanks()
+    blanks = list(pending)                                                 # pending-row index
+    for r in blanks[:writes]:
+        pending.pop(r, None)
+        categories.update(("Label 7", f"New {r}"))
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmark categoriser pass overhead.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--blank-frac", type=float, default=0.01, help="Share of rows still uncoded.")
+    ap.add_argument("--writes", type=int, default=500, help="Rows written per pass.")
+    args = ap.parse_args()
+
+    for n in args.rows:
+        df = make_df(n, args.blank_frac)
+        idx = 1
+
+        t0 = time.perf_counter()
+        legacy_pass(df, idx, list(LABELS), args.writes)
+        legacy = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        registry = CategoryRegistry(_seed_categories_from_df(df, idx))
+        pending = dict.fromkeys(_blank_row_indices(df, idx))
+        setup = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        current_pass(pending, registry, args.writes)
+        per_pass = time.perf_counter() - t0
+
+        print(f"{n:>9,} rows ({len(pending) + args.writes:,} blank): "
+              f"legacy {legacy * 1000:9.1f} ms/pass | new one-off setup {setup * 1000:8.1f} ms, "
+              f"then {per_pass * 1000:6.2f} ms/pass")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+API calls saved by --cluster-threshold on a synthetic survey of paraphrased
+answers (templates x hedges x typos), against the local mock server.
+
+    python scripts/bench_clustering.py --rows 100000 --thresholds 0 0.8 0.85 0.9
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.api_client import configure_client                  # noqa: E402
+from src.categoriser import run_categorisation_for_question   # noqa: E402
+from mock_aibots_server import MockAIBotsServer               # noqa: E402
+
+CORE = [
+    "use strong passwords", "use a password manager", "dont click on suspicious links",
+    "enable two factor authentication", "keep my personal info private", "avoid scam calls",
+    "check that the website is real", "update my software", "use antivirus", "never share my otp",
+    "verify before paying online", "block unknown numbers", "report scams to the police",
+    "be careful what i post on social media", "use scamshield", "log out of shared computers",
+]
+PREFIX = ["", "i ", "always ", "i always ", "try to ", "i try to ", "by trying to ", "mostly "]
+SUFFIX = ["", " online", " always", " when online", " and be careful", " at all times", " i guess", "."]
+
+def make_answers(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        s = rng.choice(PREFIX) + rng.choice(CORE) + rng.choice(SUFFIX)
+        if rng.random() < 0.3 and len(s) > 4:   # swap two letters
+            i = rng.randrange(len(s) - 1)
+            s = s[:i] + s[i + 1] + s[i] + s[i + 2:]
+        if rng.random() < 0.5:
+            s = s.capitalize()
+        out.append(s)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the clustering stage against the mock API.")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.8, 0.85, 0.9])
+    ap.add_argument("--batch-size", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+
+    answers = make_answers(args.rows)
+    distinct = len({" ".join(a.casefold().split()) for a in answers})
+    print(f"{args.rows} rows, {distinct} distinct answers\n")
+    print(f"{'threshold':>9} {'API calls':>10} {'rows sent':>10} {'seconds':>8}")
+    with MockAIBotsServer() as srv, tempfile.TemporaryDirectory() as tmp:
+        configure_client(base_url=srv.url, pool_size=args.concurrency)
+        os.chdir(tmp)   # keep categories_cache.json out of the repo
+        for th in args.thresholds:
+            if os.path.exists("categories_cache.json"):
+                os.remove("categories_cache.json")
+            df = pd.DataFrame({"Q": answers})
+            before = srv.requests
+            t0 = time.perf_counter()
+            logs = []
+            run_categorisation_for_question(
+                df, "Q", "Assign labels.", verbose=False, batch_size=args.batch_size,
+                concurrency=args.concurrency, cluster_threshold=th, log=logs.append,
+            )
+            elapsed = time.perf_counter() - t0
+            sent = next((l.split("->")[1].split()[0] for l in logs if "Dedup" in l), "?")
+            print(f"{th:>9} {srv.requests - before:>10} {sent:>10} {elapsed:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Load/save time and file size for the table formats main.py reads and writes:
+CSV, XLSX, Parquet and Feather, on a synthetic coded survey.
+
+"load (projected)" reads only the ID column plus one question and its [Codes]
+column, as `main.py --project-columns --id-col id` does.
+
+    python scripts/bench_io_formats.py --rows 1000000
+    python scripts/bench_io_formats.py --rows 1000000 --xlsx-rows 100000   # XLSX is very slow
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.utils import atomic_save_df, load_table  # noqa: E402
+
+ANSWERS = [
+    "Don't click on links from unknown senders",
+    "use 2FA everywhere",
+    "nil",
+    "Strong passwords and a password manager",
+    "Keep my personal details private online, check privacy settings",
+    "Report scam calls to the police hotline",
+]
+LABELS = ["Phishing/Scam Prevention", "Two-Factor Authentication", "NIL", "Password Management", "Privacy Protection"]
+QUESTIONS = ["Q1 What did you learn?", "Q2 What will you do differently?", "Q3 Any other comments?"]
+
+def make_df(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cols = {"id": np.arange(n), "age_group": rng.choice(["18-24", "25-34", "35-54", "55+"], n)}
+    for q in QUESTIONS:
+        cols[q] = np.asarray(ANSWERS, dtype=object)[rng.integers(0, len(ANSWERS), n)]
+        cols[f"{q} [Codes]"] = np.asarray(LABELS, dtype=object)[rng.integers(0, len(LABELS), n)]
+    return pd.DataFrame(cols)
+
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+def bench(df: pd.DataFrame, ext: str, tmpdir: str) -> dict:
+    path = os.path.join(tmpdir, f"survey{ext}")
+    projection = ["id", QUESTIONS[0], f"{QUESTIONS[0]} [Codes]"]
+    save = timed(lambda: atomic_save_df(df, path))
+    load = timed(lambda: load_table(path))
+    load_proj = timed(lambda: load_table(path, columns=projection))
+    return {"rows": len(df), "save_s": save, "load_s": load, "load_projected_s": load_proj,
+            "size_mb": os.path.getsize(path) / 1e6}
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark CSV / XLSX / Parquet / Feather load and save.")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--xlsx-rows", type=int, default=None,
+                    help="Rows for the XLSX case (default: --rows; openpyxl takes minutes at 1M). 0 skips it.")
+    ap.add_argument("--formats", nargs="+", default=[".csv", ".xlsx", ".parquet", ".feather"])
+    args = ap.parse_args()
+
+    df = make_df(args.rows)
+    xlsx_rows = args.rows if args.xlsx_rows is None else args.xlsx_rows
+    print(f"{args.rows} rows x {df.shape[1]} columns\n")
+    print(f"{'format':<9} {'rows':>9} {'save s':>8} {'load s':>8} {'proj s':>8} {'MB':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for ext in args.formats:
+            frame = df
+            if ext == ".xlsx":
+                if xlsx_rows <= 0:
+                    continue
+                frame = df.head(xlsx_rows)
+            try:
+                r = bench(frame, ext, tmpdir)
+            except ImportError as e:
+                print(f"{ext:<9} skipped: {e}")
+                continue
+            print(f"{ext:<9} {r['rows']:>9} {r['save_s']:>8.2f} {r['load_s']:>8.2f} "
+                  f"{r['load_projected_s']:>8.2f} {r['size_mb']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Prompt tokens per row with full prompts vs --compact-prompts, against the
+local mock server, using a real instruction from questions_config.json and
+a categories list that has already grown to `--labels` entries.
+
+    python scripts/bench_prompt_tokens.py --rows 2000 --labels 40
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from src.api_client import configure_client                  # noqa: E402
+from src.categoriser import run_categorisation_for_question   # noqa: E402
+from mock_aibots_server import MockAIBotsServer               # noqa: E402
+
+WORDS = "scam phishing password privacy link otp bank account email message website app update careful check".split()
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark prompt size per row, full vs compact prompts.")
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--labels", type=int, default=40, help="Labels already known for the question.")
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10])
+    ap.add_argument("--max-context-tokens", type=int, default=16000)
+    args = ap.parse_args()
+
+    with open(os.path.join(ROOT, "questions_config.json"), "r", encoding="utf-8") as f:
+        spec = json.load(f)[0]
+    rng = random.Random(0)
+    answers = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))) + f" #{i}" for i in range(args.rows)]
+    labels = [f"Theme {i}" for i in range(args.labels)]
+
+    print(f"{args.rows} distinct answers, {args.labels} known labels\n")
+    print(f"{'batch':>5} {'mode':>8} {'messages':>9} {'tokens':>9} {'tok/row':>8} {'rotations':>9}")
+    with MockAIBotsServer() as srv, tempfile.TemporaryDirectory() as tmp:
+        configure_client(base_url=srv.url)
+        os.chdir(tmp)   # keep categories_cache.json out of the repo
+        for bs in args.batch_sizes:
+            for compact in (False, True):
+                with open("categories_cache.json", "w", encoding="utf-8") as f:
+                    json.dump({spec["question_col"]: labels}, f)
+                logs = []
+                run_categorisation_for_question(
+                    pd.DataFrame({spec["question_col"]: answers}), spec["question_col"], spec["instruction"],
+                    verbose=False, batch_size=bs, compact_prompts=compact,
+                    max_context_tokens=args.max_context_tokens, log=logs.append,
+                )
+                line = next(l for l in logs if "Prompts:" in l)
+                msgs = int(line.split("Prompts:")[1].split()[0])
+                tokens = int(line.split("~")[1].split()[0])
+                rot = line.split(", ")[-1].split()[0] if compact else "-"
+                print(f"{bs:>5} {'compact' if compact else 'full':>8} {msgs:>9} {tokens:>9} "
+                      f"{tokens / args.rows:>8.1f} {rot:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Batched coding with whole replies vs streamed replies (--stream-responses),
+against the local mock server generating its replies a chunk at a time.
+
+Reports the time from sending a batch to its first stored row (first_row p50),
+total run time, API messages, and how many rows had to be sent again when
+--cut-rate of the replies stop halfway: a whole reply cut short is unparseable
+JSON and the batch is resent; a cut stream keeps the rows that had finished.
+
+    python scripts/bench_streaming.py --rows 600 --batch-size 20 --chunk-delay 0.01 --cut-rate 0.1
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_aibots_server import MockAIBotsServer  # noqa: E402
+from src.api_client import configure_client  # noqa: E402
+from src.categories_cache import CategoriesCache  # noqa: E402
+from src.categoriser import run_categorisation_for_question  # noqa: E402
+from src.metrics import Metrics  # noqa: E402
+
+QUESTION = "What does digital safety mean to you?"
+
+def run(stream: bool, args, workdir: str) -> dict:
+    df = pd.DataFrame({QUESTION: [f"answer number {i}" for i in range(args.rows)]})
+    # the same fault for both: the mock truncates whole replies, and cuts streamed ones
+    faults = {"cut_rate": args.cut_rate} if stream else {"malformed_rate": args.cut_rate}
+    with MockAIBotsServer(latency=args.latency, chunk_delay=args.chunk_delay, seed=args.seed, **faults) as srv:
+        metrics = Metrics()
+        configure_client(base_url=srv.url, pool_size=args.concurrency, metrics=metrics)
+        t0 = time.perf_counter()
+        run_categorisation_for_question(
+            df, QUESTION, "Assign 1-2 labels; NIL for blank/none.", verbose=False, batch_size=args.batch_size,
+            concurrency=args.concurrency, metrics=metrics, stream_responses=stream, log=lambda *_: None,
+            categories_cache=CategoriesCache(os.path.join(workdir, f"cc-{stream}.json")),
+        )
+        seconds = time.perf_counter() - t0
+        counts = srv.counts
+    report = metrics.report()
+    first_row = report["stages"].get("first_row", {})
+    return {
+        "seconds": seconds,
+        "first_row_p50_ms": first_row.get("p50_ms", 0.0),
+        "messages": counts["messages"],
+        "cut": counts["cut"] + counts["malformed"],
+        "rows_sent": counts["rows"],
+        "rows_coded": report["counters"].get("rows_coded", 0),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark streamed vs whole batched replies.")
+    ap.add_argument("--rows", type=int, default=600)
+    ap.add_argument("--batch-size", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--latency", type=float, default=0.05, help="Mock seconds before a reply starts.")
+    ap.add_argument("--chunk-delay", type=float, default=0.01, help="Mock seconds per 16 reply characters.")
+    ap.add_argument("--cut-rate", type=float, default=0.15, help="Share of replies cut off halfway.")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if args.batch_size < 2:
+        raise SystemExit("Streaming only applies to batched replies; use --batch-size 2 or more.")
+
+    print(f"{args.rows} rows, batch {args.batch_size}, concurrency {args.concurrency}, "
+          f"chunk delay {args.chunk_delay}s, cut rate {args.cut_rate}\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stream in (False, True):
+            r = run(stream, args, tmp)
+            print(f"{'streamed' if stream else 'whole':<9} first row p50 {r['first_row_p50_ms']:8.1f} ms | "
+                  f"{r['seconds']:6.2f}s | {r['messages']} messages, {r['cut']} cut off | "
+                  f"{r['rows_sent'] - args.rows} rows resent | {r['rows_coded']} rows coded")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Offline throughput suite: synthetic surveys from 1k to 1M rows coded against
+the local mock server, through `main.py` ("cli") and through
+run_categorisation_for_question directly ("function").
+
+Each case runs in its own process so peak memory (max RSS) is per case.
+Reports rows/sec, API calls per row and peak memory; save a baseline with
+--save and fail on regressions later with --compare.
+
+    python scripts/bench_suite.py --rows 1000 10000 100000 --save bench_baseline.json
+    python scripts/bench_suite.py --rows 1000 10000 100000 --compare bench_baseline.json
+    python scripts/bench_suite.py --rows 10000 --error-rate 0.02 --rate-429 0.02 --malformed-rate 0.02
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("scam phishing password privacy link otp bank account email message website app update careful "
+         "check verify report block never share strong unique family friends police call sms").split()
+QUESTIONS = ["What does digital safety mean to you?", "What digital threats concern you most?"]
+COMMON = ["nil", "na", "no", "use strong passwords", "dont click links", "scamshield", "2fa", "be careful online"]
+
+def write_survey(path: str, rows: int, unique_frac: float, seed: int = 0):
+    """CSV with an id, a demographic and len(QUESTIONS) free-text columns; ~unique_frac distinct answers."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    r = random.Random(seed)
+    n_unique = max(1, int(rows * unique_frac))
+    pool = COMMON + [" ".join(r.choice(WORDS) for _ in range(r.randint(2, 12))) + f" {i}" for i in range(n_unique)]
+    # Zipf-ish: a few answers are very common, most are rare
+    weights = 1.0 / np.arange(1, len(pool) + 1) ** 0.6
+    weights /= weights.sum()
+    cols = {"id": np.arange(rows), "age_group": rng.choice(["18-24", "25-34", "35-54", "55+"], rows)}
+    for q in QUESTIONS:
+        cols[q] = np.asarray(pool, dtype=object)[rng.choice(len(pool), rows, p=weights)]
+    pd.DataFrame(cols).to_csv(path, index=False)
+
+def write_config(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"question_col": q, "instruction": "Assign 1-2 labels; NIL for blank/none."} for q in QUESTIONS], f)
+
+# ----- child process entry points -----
+
+def child_function(args):
+    """Code every question in-process; prints a JSON result line."""
+    import pandas as pd
+    from src.api_client import configure_client
+    from src.categoriser import run_categorisation_for_question
+    from src.metrics import Metrics
+
+    metrics = Metrics()
+    configure_client(base_url=args.base_url, pool_size=args.concurrency, metrics=metrics)
+    df = pd.read_csv(args.input)
+    t0 = time.perf_counter()
+    for q in QUESTIONS:
+        run_categorisation_for_question(
+            df, q, "Assign 1-2 labels; NIL for blank/none.", verbose=False, batch_size=args.batch_size,
+            concurrency=args.concurrency, metrics=metrics, log=lambda *_: None,
+        )
+    print(json.dumps({"seconds": time.perf_counter() - t0, "rows_coded": metrics.report()["rows_coded"]}))
+
+def run_case(mode: str, csv_path: str, cfg_path: str, workdir: str, base_url: str, args) -> dict:
+    if mode == "cli":
+        out = os.path.join(workdir, "out.csv")
+        report = os.path.join(workdir, "report.json")
+        cmd = [sys.executable, os.path.join(ROOT, "main.py"), "--input", csv_path, "--output", out,
+               "--config", cfg_path, "--batch-size", str(args.batch_size), "--concurrency", str(args.concurrency),
+               "--no-verbose", "--report", report, "--response-cache", os.path.join(workdir, "rc.sqlite")]
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "function", "--input", csv_path,
+               "--base-url", base_url, "--batch-size", str(args.batch_size), "--concurrency", str(args.concurrency)]
+    env = {**os.environ, "AIBOTS_BASE_URL": base_url, "AIBOTS_API_KEY": "bench"}
+    t0 = time.perf_counter()
+    p = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    stdout = p.stdout.read()
+    _, status, usage = os.wait4(p.pid, 0)   # rusage of exactly this child
+    p.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(f"{mode} case failed ({p.returncode}):\n{stdout[-2000:]}")
+    if mode == "cli":
+        with open(report, "r", encoding="utf-8") as f:
+            rep = json.load(f)
+        seconds, rows = rep["elapsed_s"], rep["rows_coded"]
+    else:
+        res = json.loads(stdout.strip().splitlines()[-1])
+        seconds, rows = res["seconds"], res["rows_coded"]
+    return {"seconds": seconds, "wall_s": wall, "rows_coded": rows, "peak_rss_mb": usage.ru_maxrss / 1024}
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline throughput / memory suite against the mock AIBots API.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    ap.add_argument("--modes", nargs="+", default=["cli", "function"], choices=["cli", "function"])
+    ap.add_argument("--unique-frac", type=float, default=0.2, help="Distinct answers as a share of rows (default 0.2).")
+    ap.add_argument("--batch-size", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=0.0, help="Mock server seconds per message.")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--save", default=None, help="Write results JSON here (a baseline for --compare).")
+    ap.add_argument("--compare", default=None, help="Baseline JSON; exit 1 if rows/sec drops or calls/row rises past --tolerance.")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2 = 20%%).")
+    # child-process plumbing
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--input", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--base-url", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child == "function":
+        child_function(args)
+        return
+
+    from mock_aibots_server import MockAIBotsServer
+
+    results = []
+    print(f"{'mode':<9} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'calls/row':>10} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = os.path.join(tmp, "config.json")
+        write_config(cfg)
+        for n in args.rows:
+            csv_path = os.path.join(tmp, f"survey_{n}.csv")
+            write_survey(csv_path, n, args.unique_frac)
+            for mode in args.modes:
+                workdir = tempfile.mkdtemp(dir=tmp)
+                with MockAIBotsServer(latency=args.latency, error_rate=args.error_rate, rate_429=args.rate_429,
+                                      retry_after=0.05, malformed_rate=args.malformed_rate) as srv:
+                    r = run_case(mode, csv_path, cfg, workdir, srv.url, args)
+                    counts = srv.counts
+                cells = n * len(QUESTIONS)
+                r.update({
+                    "mode": mode, "rows": n,
+                    "rows_per_sec": cells / r["seconds"] if r["seconds"] > 0 else 0.0,
+                    "calls_per_row": (counts["messages"] + counts["chats"]) / cells,
+                    "server": counts,
+                })
+                results.append(r)
+                print(f"{mode:<9} {n:>9} {r['seconds']:>9.2f} {r['rows_per_sec']:>10.0f} "
+                      f"{r['calls_per_row']:>10.4f} {r['peak_rss_mb']:>9.0f}")
+    print("\nrows/s and calls/row count question cells (rows x questions).")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            base = {(b["mode"], b["rows"]): b for b in json.load(f)}
+        regressions = []
+        for r in results:
+            b = base.get((r["mode"], r["rows"]))
+            if b is None:
+                continue
+            if r["rows_per_sec"] < b["rows_per_sec"] * (1 - args.tolerance):
+                regressions.append(f"{r['mode']} {r['rows']}: {r['rows_per_sec']:.0f} rows/s vs {b['rows_per_sec']:.0f}")
+            if r["calls_per_row"] > b["calls_per_row"] * (1 + args.tolerance):
+                regressions.append(f"{r['mode']} {r['rows']}: {r['calls_per_row']:.4f} calls/row vs {b['calls_per_row']:.4f}")
+        if regressions:
+            print("\n⚠️  Regressions vs baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions vs baseline.")
+
+if __name__ == "__main__":
+    main()
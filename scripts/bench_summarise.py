@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+scripts/summarise_codes.py before vs after vectorising: per-column Python
+tidy/split/value_counts vs one cell-count + explode + alias join + groupby
+over all coded columns. Also checks both give the same counts.
+
+    python scripts/bench_summarise.py --rows 1000000 --columns 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from summarise_codes import cell_counts, summarise_counts, tidy_cell  # noqa: E402
+
+LABELS = ["Privacy Protection", "Scam/Phishing Protection", "Safe Browsing", "Password Management",
+          "Two-Factor Authentication", "2FA", "privacy", "NIL", "none", "Transaction Safety"]
+
+def make_df(n: int, n_cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cols = {}
+    for c in range(n_cols):
+        a = np.asarray(LABELS, dtype=object)[rng.integers(0, len(LABELS), n)]
+        b = np.asarray(LABELS, dtype=object)[rng.integers(0, len(LABELS), n)]
+        cell = np.where(rng.random(n) < 0.4, a + "; " + b, a).astype(object)
+        cell[rng.random(n) < 0.05] = None
+        cols[f"Q{c} [Codes]"] = cell
+    return pd.DataFrame(cols)
+
+# ---- pre-change implementation, kept here for comparison ----
+def legacy_summarise_column(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    series = df[col].map(tidy_cell)
+    split = series.dropna().astype(str).str.split(";")
+    labels = [lab.strip() for sub in split for lab in sub if lab.strip()]
+    if not labels:
+        return pd.DataFrame(columns=["Category", "Count", "%"])
+    out = pd.Series(labels).value_counts().reset_index()
+    out.columns = ["Category", "Count"]
+    out["%"] = (out["Count"] / max(1, len(df)) * 100).round(2)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark legacy vs vectorised summarise_codes.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--columns", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'rows':>9} {'legacy s':>9} {'vectorised s':>13} {'speed-up':>9}  same counts")
+    for n in args.rows:
+        df = make_df(n, args.columns)
+        cols = list(df.columns)
+
+        t0 = time.perf_counter()
+        legacy = {c: legacy_summarise_column(df, c) for c in cols}
+        t_legacy = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        new = summarise_counts(cell_counts(df, cols), len(df), cols)
+        t_new = time.perf_counter() - t0
+
+        same = all(
+            legacy[c].set_index("Category")["Count"].sort_index().to_dict()
+            == new[new["Question"] == c].set_index("Category")["Count"].sort_index().to_dict()
+            for c in cols
+        )
+        print(f"{n:>9} {t_legacy:>9.2f} {t_new:>13.3f} {t_legacy / t_new:>8.0f}x  {same}")
+
+if __name__ == "__main__":
+    main()
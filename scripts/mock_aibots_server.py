@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the AIBots chat API, for benchmarks and offline runs.
+
+Implements POST /<version>/api/chats and POST /<version>/api/chats/<id>/messages
+and answers coding prompts (single or batched) with deterministic fake labels.
+With ?streaming=true the reply is sent as server-sent events, a few characters
+per event. Faults can be injected per message: 500s, 429s with Retry-After,
+replies whose content is malformed JSON, and streams cut off midway.
+
+    python scripts/mock_aibots_server.py --port 8765
+    python scripts/mock_aibots_server.py --port 8765 --error-rate 0.01 --rate-429 0.02 --malformed-rate 0.01
+    python scripts/mock_aibots_server.py --port 8765 --chunk-delay 0.02 --cut-rate 0.1
+    AIBOTS_BASE_URL=http://127.0.0.1:8765 python main.py ...
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LABELS = ["Privacy Protection", "Scam/Phishing Protection", "Safe Browsing", "Password Management", "NIL"]
+
+def fake_label(answer: str) -> str:
+    """Stable label per answer so repeated runs code identically."""
+    h = int(hashlib.md5(answer.encode("utf-8")).hexdigest(), 16)
+    return LABELS[h % len(LABELS)]
+
+def rows_in(content: str) -> int:
+    """How many survey rows a prompt carries (a batch's items, else 1)."""
+    try:
+        return len(json.loads(content).get("items", [None]))
+    except Exception:
+        return 1
+
+def reply_for(content: str) -> str:
+    try:
+        payload = json.loads(content)
+    except Exception:
+        return "NIL"
+    if "items" in payload:
+        results = [{"row": it["row"], "categories": fake_label(str(it.get("answer", "")))} for it in payload["items"]]
+        return json.dumps({"results": results})
+    return fake_label(str(payload.get("answer", "")))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True   # headers and body go out as separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, obj: dict, headers: dict | None = None):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, reply: str, cut: bool):
+        """Reply as server-sent events over chunked encoding; `cut` drops the connection halfway."""
+        srv = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [reply[i:i + srv.chunk_chars] for i in range(0, len(reply), srv.chunk_chars)] or [""]
+        if cut:
+            pieces = pieces[: max(1, len(pieces) // 2)]
+        try:
+            for piece in pieces:
+                if srv.chunk_delay:
+                    time.sleep(srv.chunk_delay)
+                event = f"data: {json.dumps({'response': {'content': piece}})}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):   # the client stopped reading
+            self.close_connection = True
+            return
+        if cut:
+            self.close_connection = True   # no terminating chunk: the client sees a broken stream
+            return
+        done = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+
+    def _read_content(self) -> str | None:
+        """Message text from a JSON or multipart body (None if the format is refused)."""
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        ctype = self.headers.get("Content-Type", "")
+        if ctype.startswith("application/json"):
+            if self.server.multipart_only:
+                return None
+            return str(json.loads(raw or b"{}").get("content", ""))
+        if ctype.startswith("multipart/form-data"):
+            msg = BytesParser().parsebytes(b"Content-Type: " + ctype.encode() + b"\r\n\r\n" + raw)
+            for part in msg.get_payload():
+                if part.get_param("name", header="content-disposition") == "content":
+                    return part.get_payload(decode=True).decode("utf-8")
+            return ""
+        return None
+
+    def do_POST(self):
+        srv = self.server
+        path = self.path.split("?", 1)[0].rstrip("/")
+        with srv.lock:
+            srv.requests += 1
+
+        if path.endswith("/api/chats"):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with srv.lock:
+                srv.counts["chats"] += 1
+            self._send_json(201, {"id": uuid.uuid4().hex})
+            return
+
+        if path.endswith("/messages"):
+            content = self._read_content()
+            if content is None:
+                self._send_json(415, {"detail": "unsupported content type"})
+                return
+            with srv.lock:
+                srv.counts["messages"] += 1
+                srv.counts["rows"] += rows_in(content)
+                roll = srv.rng.random()
+                jitter = srv.rng.uniform(-srv.jitter, srv.jitter) if srv.jitter else 0.0
+            if srv.latency or jitter:
+                time.sleep(max(0.0, srv.latency + jitter))
+            # one roll per message picks at most one fault: 429, then 500, then malformed
+            if roll < srv.rate_429:
+                with srv.lock:
+                    srv.counts["throttled"] += 1
+                self._send_json(429, {"detail": "rate limited"}, {"Retry-After": f"{srv.retry_after:g}"})
+                return
+            roll -= srv.rate_429
+            if roll < srv.error_rate:
+                with srv.lock:
+                    srv.counts["errors"] += 1
+                self._send_json(500, {"detail": "injected server error"})
+                return
+            roll -= srv.error_rate
+            reply = reply_for(content)
+            if roll < srv.malformed_rate:
+                with srv.lock:
+                    srv.counts["malformed"] += 1
+                reply = reply[: max(1, len(reply) // 2)]   # truncated mid-JSON
+            roll -= srv.malformed_rate
+            if "streaming=true" in self.path.split("?", 1)[-1]:
+                cut = roll < srv.cut_rate
+                with srv.lock:
+                    srv.counts["streamed"] += 1
+                    srv.counts["cut"] += cut
+                self._send_stream(reply, cut)
+                return
+            if srv.chunk_delay:   # same generation time as the streamed reply, all paid up front
+                time.sleep(srv.chunk_delay * -(-len(reply) // srv.chunk_chars))
+            self._send_json(200, {"response": {"content": reply}})
+            return
+
+        self._send_json(404, {"detail": "not found"})
+
+class MockAIBotsServer:
+    """
+    Threaded stub server; use as a context manager in benchmarks.
+
+    Each message sleeps `latency` +/- `jitter` seconds, then fails with
+    probability `rate_429` (429 + Retry-After), `error_rate` (500) or
+    `malformed_rate` (200 with truncated JSON content). Faults come from a
+    seeded RNG, so a run with the same seed and request order repeats.
+
+    Replies take `chunk_delay` seconds per `chunk_chars` characters, like a model
+    generating text. A streamed reply (?streaming=true) sends each chunk as it is
+    "generated", and `cut_rate` of them stop halfway; a whole reply waits for all of it.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        multipart_only: bool = False,
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 1.0,
+        malformed_rate: float = 0.0,
+        chunk_chars: int = 16,
+        chunk_delay: float = 0.0,
+        cut_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.jitter = jitter
+        self.httpd.multipart_only = multipart_only
+        self.httpd.error_rate = error_rate
+        self.httpd.rate_429 = rate_429
+        self.httpd.retry_after = retry_after
+        self.httpd.malformed_rate = malformed_rate
+        self.httpd.chunk_chars = max(1, chunk_chars)
+        self.httpd.chunk_delay = chunk_delay
+        self.httpd.cut_rate = cut_rate
+        self.httpd.rng = random.Random(seed)
+        self.httpd.requests = 0
+        self.httpd.counts = {"chats": 0, "messages": 0, "rows": 0, "throttled": 0, "errors": 0, "malformed": 0,
+                              "streamed": 0, "cut": 0}
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    @property
+    def counts(self) -> dict:
+        """chats / messages created, rows those messages carried, and how many messages got each injected fault."""
+        with self.httpd.lock:
+            return dict(self.httpd.counts)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    ap = argparse.ArgumentParser(description="Run a local mock of the AIBots chat API.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep per message.")
+    ap.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to --latency.")
+    ap.add_argument("--multipart-only", action="store_true", help="Reject JSON message bodies with 415.")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Share of messages answered with a 500.")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="Share of messages answered with a 429.")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with each 429.")
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="Share of replies whose content is truncated JSON.")
+    ap.add_argument("--chunk-chars", type=int, default=16, help="Reply characters per streamed event.")
+    ap.add_argument("--chunk-delay", type=float, default=0.0,
+                    help="Seconds to 'generate' each --chunk-chars of a reply (streamed or not).")
+    ap.add_argument("--cut-rate", type=float, default=0.0, help="Share of streamed replies cut off halfway.")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for the fault injection RNG.")
+    args = ap.parse_args()
+
+    srv = MockAIBotsServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, multipart_only=args.multipart_only,
+        error_rate=args.error_rate, rate_429=args.rate_429, retry_after=args.retry_after,
+        malformed_rate=args.malformed_rate, chunk_chars=args.chunk_chars, chunk_delay=args.chunk_delay,
+        cut_rate=args.cut_rate, seed=args.seed,
+    )
+    print(f"Mock AIBots API listening on {srv.url} (Ctrl+C to stop)")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
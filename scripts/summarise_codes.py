@@ -1,25 +1,13 @@
 #!/usr/bin/env python
 import argparse
+import os
+import sys
 import pandas as pd
 
-# ---- Edit this alias map to collapse near-duplicates across ALL coded columns ----
-# keys are lowercased variants -> unified label
-ALIAS_MAP = {
-    "phishing prevention": "Phishing/Scam Prevention",
-    "scam prevention": "Phishing/Scam Prevention",
-    "phishing/scam prevention": "Phishing/Scam Prevention",
-    "two factor authentication": "Two-Factor Authentication",
-    "2fa": "Two-Factor Authentication",
-    "passwords": "Password Management",
-    "strong passwords": "Password Management",
-    "privacy": "Privacy Protection",
-    "privacy protection": "Privacy Protection",
-    "scam awareness": "Scam Awareness",
-    "nil": "NIL",
-    "none": "NIL",
-    "na": "NIL",
-    "n/a": "NIL",
-}
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.aliases import ALIAS_MAP  # edit src/aliases.py to collapse near-duplicate labels
+from src.categoriser import QUARANTINE_MARK
+from src.utils import iter_table_chunks, load_table, read_columns
 
 def tidy_cell(val: str | float | None) -> str | float | None:
     """Deduplicate within a cell and collapse aliases -> unified labels."""
@@ -36,77 +24,167 @@ def tidy_cell(val: str | float | None) -> str | float | None:
             seen.add(label)
     return "; ".join(out)
 
+# ----- vectorised, single-pass summary -----
+# Coded columns repeat the same few cell strings, so everything below works on
+# (question, cell[, by]) -> row count tables and only splits each distinct cell once.
+
+def cell_counts(df: pd.DataFrame, cols: list[str], by: str | None = None) -> pd.DataFrame:
+    """Rows per distinct (question, cell[, by]) across all coded columns: one tall table."""
+    keys = [by] if by else []
+    parts = []
+    for col in cols:
+        sub = df[[col] + keys].dropna(subset=[col])
+        counts = sub.groupby([col] + keys, sort=False, dropna=False).size()
+        counts = counts.reset_index(name="n").rename(columns={col: "cell"})
+        counts.insert(0, "question", col)
+        parts.append(counts)
+    out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["question", "cell"] + keys + ["n"])
+    out["cell"] = out["cell"].astype(str)
+    return out
+
+def add_counts(acc: pd.DataFrame | None, new: pd.DataFrame, by: str | None = None) -> pd.DataFrame:
+    """Merge two cell_counts() tables (for chunked reads)."""
+    if acc is None:
+        return new
+    keys = ["question", "cell"] + ([by] if by else [])
+    return pd.concat([acc, new], ignore_index=True).groupby(keys, sort=False, dropna=False, as_index=False)["n"].sum()
+
+def cell_labels(cells: pd.Series, aliases: dict[str, str] | None = None) -> pd.DataFrame:
+    """(cell, label) for each distinct cell: split, strip, alias-join on the casefolded label, dedupe.
+    QUARANTINE_MARK is a failed row, not a label, so it is dropped."""
+    aliases = ALIAS_MAP if aliases is None else aliases
+    lab = pd.DataFrame({"cell": pd.unique(cells)})
+    lab["label"] = lab["cell"].str.split(";")
+    lab = lab.explode("label")
+    lab["label"] = lab["label"].str.strip()
+    lab = lab[lab["label"].notna() & (lab["label"] != "") & (lab["label"] != QUARANTINE_MARK)]
+    alias = pd.Series(aliases, dtype=object)
+    lab["label"] = lab["label"].str.casefold().map(alias).fillna(lab["label"])
+    return lab.drop_duplicates(["cell", "label"]).reset_index(drop=True)
+
+def summarise_counts(counts: pd.DataFrame, total_rows: int, order: list[str]) -> pd.DataFrame:
+    """Question/Category/Count/% for every question at once (% of total rows)."""
+    lab = cell_labels(counts["cell"])
+    per_cell = counts.groupby(["question", "cell"], sort=False, as_index=False)["n"].sum()
+    out = (per_cell.merge(lab, on="cell")
+                   .groupby(["question", "label"], sort=False, as_index=False)["n"].sum()
+                   .rename(columns={"question": "Question", "label": "Category", "n": "Count"}))
+    out["%"] = (out["Count"] / max(1, total_rows) * 100).round(2)
+    out["_q"] = out["Question"].map({q: i for i, q in enumerate(order)})
+    out = out.sort_values(["_q", "Count"], ascending=[True, False], kind="stable")
+    return out.drop(columns="_q").reset_index(drop=True)
+
+def cooccurrence(counts: pd.DataFrame) -> pd.DataFrame:
+    """How many rows carry each pair of labels together, per question."""
+    lab = cell_labels(counts["cell"])
+    per_cell = counts.groupby(["question", "cell"], sort=False, as_index=False)["n"].sum()
+    pairs = lab.merge(lab, on="cell", suffixes=("_a", "_b"))
+    pairs = pairs[pairs["label_a"] < pairs["label_b"]]
+    out = (per_cell.merge(pairs, on="cell")
+                   .groupby(["question", "label_a", "label_b"], sort=False, as_index=False)["n"].sum()
+                   .rename(columns={"question": "Question", "label_a": "Category A", "label_b": "Category B", "n": "Count"}))
+    return out.sort_values(["Question", "Count"], ascending=[True, False], kind="stable").reset_index(drop=True)
+
+def crosstab(counts: pd.DataFrame, by: str) -> pd.DataFrame:
+    """Rows per (question, label, value of `by`), wide: one column per `by` value."""
+    lab = cell_labels(counts["cell"])
+    long = (counts.merge(lab, on="cell")
+                  .groupby(["question", "label", by], sort=False, dropna=False)["n"].sum())
+    wide = long.unstack(by, fill_value=0)
+    wide = wide[sorted(wide.columns, key=lambda v: (pd.isna(v), str(v)))]   # blanks last
+    wide.columns = ["(blank)" if pd.isna(v) else str(v) for v in wide.columns]
+    wide["Total"] = wide.sum(axis=1)
+    wide.index.names = ["Question", "Category"]
+    wide = wide.reset_index()
+    return wide.sort_values(["Question", "Total"], ascending=[True, False], kind="stable").reset_index(drop=True)
+
 def summarise_column(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """Return Category/Count/% for one coded column (based on total rows)."""
-    # in-place tidy for this view (does not modify df on disk)
-    series = df[col].map(tidy_cell)
-    # explode labels
-    split = (
-        series.dropna()
-              .astype(str)
-              .str.split(";")
-    )
-    labels = [
-        lab.strip()
-        for sub in split
-        for lab in sub
-        if lab.strip()
-    ]
-    if not labels:
-        return pd.DataFrame(columns=["Category", "Count", "%"])
-    counts = pd.Series(labels).value_counts()
-    out = counts.reset_index()
-    out.columns = ["Category", "Count"]
-    total = len(df) if len(df) > 0 else 1
-    out["%"] = (out["Count"] / total * 100).round(2)
-    return out
+    out = summarise_counts(cell_counts(df, [col]), len(df), [col])
+    return out.drop(columns="Question")
 
-def find_coded_columns(df: pd.DataFrame) -> list[str]:
-    """Pick columns that look like LLM-coded outputs."""
-    return [c for c in df.columns if "[Codes]" in c or "Code for:" in c]
+def find_coded_columns(columns) -> list[str]:
+    """Pick columns that look like LLM-coded outputs (takes a DataFrame or a list of names)."""
+    return [c for c in columns if "[Codes]" in c or "Code for:" in c]
 
 def main():
     ap = argparse.ArgumentParser(description="Summarise coded survey columns (Category, Count, %).")
-    ap.add_argument("--input", required=True, help="Path to coded CSV/Excel.")
+    ap.add_argument("--input", required=True, help="Path to coded CSV/Excel/Parquet/Feather.")
     ap.add_argument("--sheet", default=None, help="Excel sheet name (if XLSX).")
     ap.add_argument("--save-csv", default=None, help="Optional: path to save combined summary CSV.")
+    ap.add_argument("--by", default=None, help="Demographic column for a label x value cross-tab (e.g. age_group).")
+    ap.add_argument("--save-crosstab", default=None, help="Optional: path to save the --by cross-tab CSV.")
+    ap.add_argument("--cooccurrence", action="store_true", help="Also count pairs of labels given to the same answer.")
+    ap.add_argument("--save-cooccurrence", default=None, help="Optional: path to save the co-occurrence CSV.")
+    ap.add_argument("--chunksize", type=int, default=0,
+                    help="Read a CSV/Parquet file this many rows at a time, so memory stays bounded. 0 = load at once.")
     args = ap.parse_args()
 
-    # Load
-    if args.input.lower().endswith((".xlsx", ".xls")):
-        df = pd.read_excel(args.input, sheet_name=args.sheet)
-    else:
-        df = pd.read_csv(args.input)
-
-    coded_cols = find_coded_columns(df)
+    # Load only the coded columns (plus --by)
+    header = read_columns(args.input, sheet=args.sheet)
+    coded_cols = find_coded_columns(header)
     if not coded_cols:
         print("No coded columns found. (Look for headers containing '[Codes]' or 'Code for:')")
         return
+    if args.by and args.by not in header:
+        raise SystemExit(f"--by column not found: {args.by}")
+    load_cols = [c for c in header if c in coded_cols or c == args.by]
+
+    counts, total_rows = None, 0
+    if args.chunksize > 0:
+        for chunk in iter_table_chunks(args.input, args.chunksize, load_cols):
+            counts = add_counts(counts, cell_counts(chunk, coded_cols, args.by), args.by)
+            total_rows += len(chunk)
+    else:
+        df = load_table(args.input, columns=load_cols, sheet=args.sheet)
+        counts, total_rows = cell_counts(df, coded_cols, args.by), len(df)
+        del df
+    if counts is None:
+        counts = cell_counts(pd.DataFrame(columns=load_cols), coded_cols, args.by)
 
-    all_blocks = []
     print(f"\nFound {len(coded_cols)} coded column(s):")
     for c in coded_cols:
         print(f"  • {c}")
     print()
 
+    summary = summarise_counts(counts, total_rows, coded_cols)
     for col in coded_cols:
-        summary = summarise_column(df, col)
+        block = summary[summary["Question"] == col].drop(columns="Question")
         print(f"===== {col} =====")
-        if summary.empty:
+        if block.empty:
             print("(no labels)")
             print()
             continue
-        print(summary.to_string(index=False))
+        print(block.to_string(index=False))
         print()
-        # for optional combined export
-        tmp = summary.copy()
-        tmp.insert(0, "Question", col)
-        all_blocks.append(tmp)
-
-    if args.save_csv and all_blocks:
-        combined = pd.concat(all_blocks, ignore_index=True)
-        combined.to_csv(args.save_csv, index=False)
+
+    if args.save_csv and not summary.empty:
+        summary.to_csv(args.save_csv, index=False)
         print(f"Saved combined summary to: {args.save_csv}")
 
+    if args.cooccurrence or args.save_cooccurrence:
+        pairs = cooccurrence(counts)
+        for col in coded_cols:
+            block = pairs[pairs["Question"] == col].drop(columns="Question")
+            if not block.empty:
+                print(f"===== {col} — labels given together (top 20) =====")
+                print(block.head(20).to_string(index=False))
+                print()
+        if args.save_cooccurrence:
+            pairs.to_csv(args.save_cooccurrence, index=False)
+            print(f"Saved co-occurrence counts to: {args.save_cooccurrence}")
+
+    if args.by:
+        table = crosstab(counts, args.by)
+        for col in coded_cols:
+            block = table[table["Question"] == col].drop(columns="Question")
+            if not block.empty:
+                print(f"===== {col} by {args.by} =====")
+                print(block.to_string(index=False))
+                print()
+        if args.save_crosstab:
+            table.to_csv(args.save_crosstab, index=False)
+            print(f"Saved cross-tab to: {args.save_crosstab}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,25 @@
+# ---- Edit this alias map to collapse near-duplicates across ALL coded columns ----
+# keys are lowercased variants -> unified label. Used by scripts/summarise_codes.py
+# after coding, and by the pre-classifier (for labels a question actually uses) before it.
+ALIAS_MAP = {
+    "phishing prevention": "Phishing/Scam Prevention",
+    "scam prevention": "Phishing/Scam Prevention",
+    "phishing/scam prevention": "Phishing/Scam Prevention",
+    "two factor authentication": "Two-Factor Authentication",
+    "2fa": "Two-Factor Authentication",
+    "passwords": "Password Management",
+    "strong passwords": "Password Management",
+    "privacy": "Privacy Protection",
+    "privacy protection": "Privacy Protection",
+    "scam awareness": "Scam Awareness",
+    "nil": "NIL",
+    "none": "NIL",
+    "na": "NIL",
+    "n/a": "NIL",
+}
+
+# answers that mean "nothing to say"; coded NIL without asking the LLM
+NIL_ANSWERS = {
+    "", "-", "--", ".", "nil", "na", "n/a", "n.a.", "none", "no", "nope", "nothing", "null",
+    "not applicable", "no comment", "no comments", "no remarks", "nothing to add",
+}
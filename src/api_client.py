@@ -1,39 +1,401 @@
 import os
 import json
+import threading
+import time
+from email.utils import parsedate_to_datetime
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-API_KEY  = os.getenv("AIBOTS_API_KEY")
-BASE_URL = os.getenv("AIBOTS_BASE_URL", "https://api.uat.aibots.gov.sg")
-VERSION  = os.getenv("AIBOTS_VERSION", "v1.0")
-HEADERS  = {"X-ATLAS-Key": API_KEY}
-VERIFY   = os.getenv("AIBOTS_VERIFY", "false").lower() in ("1", "true", "yes")
+API_KEY   = os.getenv("AIBOTS_API_KEY")
+BASE_URL  = os.getenv("AIBOTS_BASE_URL", "https://api.uat.aibots.gov.sg")
+VERSION   = os.getenv("AIBOTS_VERSION", "v1.0")
+HEADERS   = {"X-ATLAS-Key": API_KEY}
+VERIFY    = os.getenv("AIBOTS_VERIFY", "false").lower() in ("1", "true", "yes")
+POOL_SIZE = int(os.getenv("AIBOTS_POOL_SIZE", "10"))
+MAX_IN_FLIGHT = int(os.getenv("AIBOTS_MAX_IN_FLIGHT", "0"))   # 0 = no cap beyond the pool size
+RPM = float(os.getenv("AIBOTS_RPM", "0"))                        # requests/min, 0 = unlimited
+TPM = float(os.getenv("AIBOTS_TPM", "0"))                        # prompt+reply tokens/min, 0 = unlimited
+
+class RateLimitError(RuntimeError):
+    """The API kept answering 429/5xx after the client waited and retried."""
+
+def _retry_after(r: requests.Response) -> float | None:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if any."""
+    val = r.headers.get("Retry-After")
+    if not val:
+        return None
+    try:
+        return max(0.0, float(val))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(val).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class _TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.available = self.capacity
+        self._t = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self._t) * self.rate)
+        self._t = now
+
+    def wait_for(self, n: float) -> float:
+        """Seconds until `n` (capped at capacity) can be taken; 0 if it can be taken now."""
+        n = min(n, self.capacity)
+        return 0.0 if self.available >= n else (n - self.available) / self.rate
+
+class RateLimiter:
+    """
+    Client-side throttle shared by every request from one client.
+
+    * token buckets for requests/min and tokens/min (each holds `burst_seconds` of quota);
+    * a Retry-After hold: after a 429 nobody sends until the server's deadline passes;
+    * an AIMD concurrency window: halved on 429/5xx, grown by ~1 slot per window of
+      successes, between 1 and `max_concurrency`.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_concurrency: int = 10, burst_seconds: float = 10.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._requests = _TokenBucket(rpm, burst_seconds) if rpm > 0 else None
+        self._tokens = _TokenBucket(tpm, burst_seconds) if tpm > 0 else None
+        self._hold_until = 0.0
+        self._cond = threading.Condition()
+        self.counts = {"requests": 0, "ok": 0, "throttled": 0, "server_errors": 0, "errors": 0}
+        self.wait_seconds = 0.0
+
+    def acquire(self, tokens: int = 0):
+        t0 = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                for b in (self._requests, self._tokens):
+                    if b is not None:
+                        b.refill(now)
+                wait = None
+                if now < self._hold_until:
+                    wait = self._hold_until - now
+                elif self.in_flight < int(self.limit):
+                    wait = max(
+                        self._requests.wait_for(1) if self._requests else 0.0,
+                        self._tokens.wait_for(tokens) if self._tokens else 0.0,
+                    )
+                    if wait <= 0:
+                        if self._requests:
+                            self._requests.available -= 1
+                        if self._tokens:
+                            self._tokens.available -= tokens
+                        self.in_flight += 1
+                        self.counts["requests"] += 1
+                        self.wait_seconds += time.monotonic() - t0
+                        return
+                self._cond.wait(timeout=wait)
+
+    def release(self, status: int | None, *, retry_after: float | None = None, reply_tokens: int = 0):
+        """status=None means a transport error (no HTTP response)."""
+        with self._cond:
+            self.in_flight -= 1
+            if self._tokens is not None and reply_tokens:
+                self._tokens.available -= reply_tokens   # may go negative: borrow from the next refill
+            if status == 429 or (status is not None and status >= 500):
+                self.counts["throttled" if status == 429 else "server_errors"] += 1
+                self.limit = max(1.0, self.limit / 2)
+                if retry_after:
+                    self._hold_until = max(self._hold_until, time.monotonic() + retry_after)
+            elif status is None:
+                self.counts["errors"] += 1
+            else:
+                self.counts["ok"] += 1
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                **self.counts,
+                "concurrency_limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "hold_seconds_left": round(max(0.0, self._hold_until - now), 3),
+                "requests_available": round(self._requests.available, 2) if self._requests else None,
+                "tokens_available": round(self._tokens.available, 1) if self._tokens else None,
+            }
+
+class AIBotsClient:
+    """
+    Keep-alive client for the AIBots chat API.
+
+    One `requests.Session` with a pooled adapter is shared by every call, so
+    TCP/TLS handshakes are paid once per pooled connection instead of once per
+    message. The client also remembers whether the messages endpoint takes a
+    JSON body or needs multipart, so the losing format is not retried each call.
+
+    Every request goes through a shared RateLimiter (requests/min, tokens/min,
+    AIMD concurrency capped at `max_in_flight` or the pool size). 429 and 5xx
+    replies are retried here, honouring Retry-After, before anything is raised.
+
+    Pass `metrics` (a src.metrics.Metrics) to time the "rate_limit_wait",
+    "network" (HTTP round trip) and "response_decode" stages of each call.
+    For a streamed reply ("stream_message") "network" ends at the headers, but the
+    request keeps its limiter slot until the body is read, and its reply tokens are
+    charged then.
+    """
+
+    def __init__(
+        self,
+        *,
+        base_url: str = BASE_URL,
+        version: str = VERSION,
+        api_key: str | None = API_KEY,
+        verify: bool = VERIFY,
+        pool_size: int = POOL_SIZE,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        rpm: float = RPM,
+        tpm: float = TPM,
+        throttle_retries: int = 5,
+        metrics=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.version = version
+        self.headers = {"X-ATLAS-Key": api_key}
+        self.verify = verify
+        self.pool_size = max(1, pool_size)
+        self.content_mode: str | None = None   # "json" | "multipart" once known
+        self.throttle_retries = max(0, throttle_retries)
+        self.metrics = metrics
+        self.limiter = RateLimiter(rpm, tpm, max_concurrency=max_in_flight if max_in_flight > 0 else self.pool_size)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _observe(self, stage: str, t0: float) -> float:
+        now = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.observe(stage, now - t0)
+        return now
+
+    def _json(self, r: requests.Response) -> dict:
+        t0 = time.perf_counter()
+        data = r.json()
+        self._observe("response_decode", t0)
+        return data
+
+    def _post(self, url: str, *, tokens: int = 0, **kwargs) -> requests.Response:
+        """POST through the rate limiter; 429/5xx are retried after backing off."""
+        for attempt in range(self.throttle_retries + 1):
+            t0 = time.perf_counter()
+            self.limiter.acquire(tokens)
+            t0 = self._observe("rate_limit_wait", t0)
+            try:
+                r = self.session.post(url, **kwargs)
+            except Exception:
+                self.limiter.release(None)
+                raise
+            self._observe("network", t0)
+            throttled = r.status_code == 429 or r.status_code >= 500
+            retry_after = _retry_after(r) if throttled else None
+            if kwargs.get("stream") and r.status_code in (200, 201):
+                return r   # still generating: _iter_stream releases the slot and charges its tokens at the end
+            self.limiter.release(r.status_code, retry_after=retry_after, reply_tokens=len(r.content) // 4)
+            if not throttled:
+                return r
+            if attempt < self.throttle_retries and retry_after is None:
+                time.sleep(min(30.0, 0.5 * 2 ** attempt))
+        raise RateLimitError(f"Request throttled: {r.status_code} {r.text}")
+
+    def create_chat(self, model: str = "azure~openai.gpt-4o-mini", name: str = "") -> str:
+        url = f"{self.base_url}/{self.version}/api/chats"
+        payload = {
+            "name": name,
+            "agents": [],
+            "params": {},
+            "properties": {},
+            "model": model,
+            "pinned": False,
+        }
+        r = self._post(
+            url,
+            headers={**self.headers, "Content-Type": "application/json"},
+            json=payload,
+            timeout=30,
+            verify=self.verify,
+        )
+        if r.status_code not in (200, 201):
+            raise RuntimeError(f"Create chat failed: {r.status_code} {r.text}")
+        chat_id = self._json(r).get("id")
+        if not chat_id:
+            raise RuntimeError(f"No chat id returned: {r.text}")
+        return chat_id
+
+    def send_message(
+        self,
+        chat_id: str,
+        text: str,
+        *,
+        streaming: bool = False,
+        cloak: bool = True,
+        pipeline: str | None = None,
+        params: dict | None = None,
+        properties: dict | None = None,
+    ) -> dict:
+        r = self._message(chat_id, text, streaming=streaming, cloak=cloak, pipeline=pipeline,
+                          params=params, properties=properties)
+        if streaming:
+            return {"response": {"content": "".join(self._iter_stream(r))}}
+        return self._json(r)
+
+    def stream_message(
+        self,
+        chat_id: str,
+        text: str,
+        *,
+        cloak: bool = True,
+        pipeline: str | None = None,
+        params: dict | None = None,
+        properties: dict | None = None,
+    ):
+        """Send with streaming=true and yield the reply text piece by piece as it arrives."""
+        r = self._message(chat_id, text, streaming=True, cloak=cloak, pipeline=pipeline,
+                          params=params, properties=properties)
+        yield from self._iter_stream(r)
+
+    def _iter_stream(self, r: requests.Response):
+        """
+        Text deltas from a server-sent-events reply: 'data: {"response": {"content": ...}}'
+        lines (or {"content": ...} / {"delta": ...} / plain text), ending at 'data: [DONE]'.
+        Events that repeat the whole text so far are reduced to the new part. A reply
+        that is not text/event-stream (the server ignored streaming) is yielded whole.
+        """
+        so_far = ""
+        broken = False
+        try:
+            if "text/event-stream" not in r.headers.get("Content-Type", ""):
+                so_far = (self._json(r).get("response", {}) or {}).get("content", "")
+                yield so_far
+                return
+            r.encoding = "utf-8"
+            for line in r.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    ev = json.loads(data)
+                except ValueError:
+                    ev = data
+                if isinstance(ev, dict):
+                    resp = ev.get("response")
+                    ev = (resp.get("content") if isinstance(resp, dict) else None) \
+                        or ev.get("content") or ev.get("delta") or ev.get("text") or ""
+                text = str(ev)
+                if so_far and text.startswith(so_far):   # cumulative event
+                    text = text[len(so_far):]
+                if text:
+                    so_far += text
+                    yield text
+        except Exception:
+            broken = True
+            raise
+        finally:
+            r.close()
+            # the slot _post kept while the reply was generating; a cut stream counts as a transport error
+            self.limiter.release(None if broken else r.status_code, reply_tokens=len(so_far) // 4)
+
+    def _message(
+        self,
+        chat_id: str,
+        text: str,
+        *,
+        streaming: bool,
+        cloak: bool,
+        pipeline: str | None,
+        params: dict | None,
+        properties: dict | None,
+    ) -> requests.Response:
+        """POST one message (JSON body, falling back to multipart); returns the 200/201 response."""
+        url = f"{self.base_url}/{self.version}/api/chats/{chat_id}/messages"
+        qp  = {"streaming": str(streaming).lower(), "cloak": str(cloak).lower()}
+        if pipeline:
+            qp["pipeline"] = pipeline
+
+        if self.content_mode != "multipart":
+            body = {"content": text}
+            if params is not None:
+                body["params"] = params
+            if properties is not None:
+                body["properties"] = properties
+
+            r = self._post(
+                url,
+                tokens=len(text) // 4,
+                headers={**self.headers, "Content-Type": "application/json"},
+                json=body,
+                timeout=60,
+                verify=self.verify,
+                params=qp,
+                stream=streaming,
+            )
+            if r.status_code in (200, 201):
+                self.content_mode = "json"
+                return r
+            if self.content_mode == "json":
+                # JSON is known to work here, so multipart would not help
+                raise RuntimeError(f"Send message failed: {r.status_code} {r.text}")
+            r.close()
+
+        # Fallback to multipart
+        files = {"content": (None, text)}
+        if params is not None:
+            files["params"] = (None, json.dumps(params, ensure_ascii=True, separators=(",", ":")))
+        if properties is not None:
+            files["properties"] = (None, json.dumps(properties, ensure_ascii=True, separators=(",", ":")))
+
+        r = self._post(url, tokens=len(text) // 4, headers=self.headers, files=files,
+                       timeout=60, verify=self.verify, params=qp, stream=streaming)
+        if r.status_code not in (200, 201):
+            raise RuntimeError(f"Send message failed: {r.status_code} {r.text}")
+        self.content_mode = "multipart"
+        return r
+
+_client: AIBotsClient | None = None
+_client_lock = threading.Lock()
+
+def get_client() -> AIBotsClient:
+    """Process-wide client used by the module-level helpers below."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AIBotsClient()
+        return _client
+
+def configure_client(**kwargs) -> AIBotsClient:
+    """Replace the process-wide client, e.g. configure_client(pool_size=16)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = AIBotsClient(**kwargs)
+        return _client
 
 def create_chat(model: str = "azure~openai.gpt-4o-mini", name: str = "") -> str:
-    url = f"{BASE_URL}/{VERSION}/api/chats"
-    payload = {
-        "name": name,
-        "agents": [],
-        "params": {},
-        "properties": {},
-        "model": model,
-        "pinned": False,
-    }
-    r = requests.post(
-        url,
-        headers={**HEADERS, "Content-Type": "application/json"},
-        json=payload,
-        timeout=30,
-        verify=VERIFY,
-    )
-    if r.status_code not in (200, 201):
-        raise RuntimeError(f"Create chat failed: {r.status_code} {r.text}")
-    chat_id = r.json().get("id")
-    if not chat_id:
-        raise RuntimeError(f"No chat id returned: {r.text}")
-    return chat_id
+    return get_client().create_chat(model=model, name=name)
 
 def send_message(
     chat_id: str,
@@ -45,36 +407,30 @@ def send_message(
     params: dict | None = None,
     properties: dict | None = None,
 ) -> dict:
-    url = f"{BASE_URL}/{VERSION}/api/chats/{chat_id}/messages"
-    qp  = {"streaming": str(streaming).lower(), "cloak": str(cloak).lower()}
-    if pipeline:
-        qp["pipeline"] = pipeline
-
-    body = {"content": text}
-    if params is not None:
-        body["params"] = params
-    if properties is not None:
-        body["properties"] = properties
-
-    r = requests.post(
-        url,
-        headers={**HEADERS, "Content-Type": "application/json"},
-        json=body,
-        timeout=60,
-        verify=VERIFY,
-        params=qp,
+    return get_client().send_message(
+        chat_id,
+        text,
+        streaming=streaming,
+        cloak=cloak,
+        pipeline=pipeline,
+        params=params,
+        properties=properties,
+    )
+
+def stream_message(
+    chat_id: str,
+    text: str,
+    *,
+    cloak: bool = True,
+    pipeline: str | None = None,
+    params: dict | None = None,
+    properties: dict | None = None,
+):
+    return get_client().stream_message(
+        chat_id,
+        text,
+        cloak=cloak,
+        pipeline=pipeline,
+        params=params,
+        properties=properties,
     )
-    if r.status_code in (200, 201):
-        return r.json()
-
-    # Fallback to multipart
-    files = {"content": (None, text)}
-    if params is not None:
-        files["params"] = (None, json.dumps(params, ensure_ascii=True, separators=(",", ":")))
-    if properties is not None:
-        files["properties"] = (None, json.dumps(properties, ensure_ascii=True, separators=(",", ":")))
-
-    r = requests.post(url, headers=HEADERS, files=files, timeout=60, verify=VERIFY, params=qp)
-    if r.status_code not in (200, 201):
-        raise RuntimeError(f"Send message failed: {r.status_code} {r.text}")
-    return r.json()
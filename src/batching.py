@@ -0,0 +1,62 @@
+from __future__ import annotations
+from typing import Callable, Iterable, Iterator
+
+from src.utils import estimate_tokens
+
+ITEM_OVERHEAD_TOKENS = 8   # {"row":123,"answer":""} wrapper around each answer
+
+class AdaptiveBatcher:
+    """
+    Packs rows into batches that fit a prompt token budget, with an adaptive item cap.
+
+    A batch is closed when adding the next answer would push the estimated prompt
+    (fixed overhead + answers) past `token_budget`, or when it reaches the current
+    item cap. The cap halves whenever a reply fails to parse or drops rows, and
+    grows again after `grow_after` clean replies in a row, up to `max_items`.
+    """
+
+    def __init__(self, token_budget: int, max_items: int, *, min_items: int = 1, grow_after: int = 2):
+        self.token_budget = max(1, token_budget)
+        self.max_items = max(1, max_items)
+        self.min_items = max(1, min(min_items, self.max_items))
+        self.grow_after = max(1, grow_after)
+        self.limit = self.max_items
+        self._clean_streak = 0
+        self.shrinks = 0
+        self.grows = 0
+
+    def batches(
+        self,
+        rows: Iterable[int],
+        answer_of: Callable[[int], str],
+        overhead_tokens: Callable[[], int],
+    ) -> Iterator[list[int]]:
+        """Yield row groups lazily, so feedback from earlier batches shapes later ones."""
+        group: list[int] = []
+        used = 0
+        budget = self.token_budget - overhead_tokens()
+        for r in rows:
+            cost = estimate_tokens(answer_of(r)) + ITEM_OVERHEAD_TOKENS
+            if group and (len(group) >= self.limit or used + cost > budget):
+                yield group
+                group, used = [], 0
+                budget = self.token_budget - overhead_tokens()
+            group.append(r)
+            used += cost
+        if group:
+            yield group
+
+    def record(self, sent: int, returned: int, parsed: bool):
+        """Feed back one reply: did it parse, and did every row come back?"""
+        if not parsed or returned < sent:
+            self._clean_streak = 0
+            new_limit = max(self.min_items, min(self.limit, sent) // 2)
+            if new_limit < self.limit:
+                self.limit = new_limit
+                self.shrinks += 1
+            return
+        self._clean_streak += 1
+        if self._clean_streak >= self.grow_after and self.limit < self.max_items:
+            self.limit = min(self.max_items, self.limit + max(1, self.limit // 4))
+            self._clean_streak = 0
+            self.grows += 1
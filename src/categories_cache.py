@@ -0,0 +1,159 @@
+from __future__ import annotations
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils import normalise_answer
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_FILE = "categories_cache.json"
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive cross-process lock on `<path>.lock` (the data file itself is swapped by os.replace)."""
+    with open(path + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # itself retries for ~10s
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read(path: str) -> dict[str, list[str]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        raise ValueError(f"{path} is not valid JSON ({e}); fix or delete it.") from None
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} should hold {{question: [labels]}}; fix or delete it.")
+    return {str(q): [str(lab) for lab in labels] for q, labels in data.items()}
+
+def _dump(data: dict[str, list[str]]) -> str:
+    """One question per line: still valid, hand-editable JSON, without indent=2's line per label."""
+    lines = [f"  {json.dumps(q, ensure_ascii=False)}: {json.dumps(labels, ensure_ascii=False)}"
+             for q, labels in data.items()]
+    return "{\n" + ",\n".join(lines) + "\n}\n" if lines else "{}\n"
+
+class CategoriesCache:
+    """
+    Per-question label lists kept between runs (`categories_cache.json`).
+
+    Held in memory and shared by every question of a run. `update()` merges
+    labels in and writes at most every `flush_interval` seconds; `flush()`
+    writes now. A write takes a lock file, re-reads the file and merges this
+    run's new labels into it, then swaps it in atomically, so two runs sharing
+    one cache both keep their labels. Labels are matched ignoring case and
+    spacing; the first spelling stored wins.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_interval = max(0.0, flush_interval)
+        self._lock = threading.Lock()
+        self._data = _read(path)
+        self._keys: dict[str, set[str]] = {}       # question -> labels as stored + normalised, built on first use
+        self._added: dict[str, list[str]] = {}     # new since the last flush
+        self._retired: dict[str, set[str]] = {}    # removed since the last flush
+        self._last_flush = time.monotonic()
+
+    def _keys_for(self, question: str) -> set[str]:
+        keys = self._keys.get(question)
+        if keys is None:
+            labels = self._data.get(question, [])
+            # exact spellings too, so re-sending a known list skips normalise_answer
+            keys = self._keys[question] = {normalise_answer(lab) for lab in labels} | set(labels)
+        return keys
+
+    def get(self, question: str) -> list[str]:
+        with self._lock:
+            return list(self._data.get(question, []))
+
+    def update(self, question: str, labels):
+        """Merge labels into a question's list; written out once `flush_interval` has passed."""
+        with self._lock:
+            keys = self._keys_for(question)
+            for lab in labels:
+                if lab in keys:
+                    continue
+                key = normalise_answer(lab)
+                known = not key or key in keys
+                keys.add(lab)
+                if not known:
+                    keys.add(key)
+                    self._data.setdefault(question, []).append(lab)
+                    self._added.setdefault(question, []).append(lab)
+                    self._retired.get(question, set()).discard(key)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def retire(self, question: str, labels):
+        """Drop labels from a question's list (here and, on the next flush, on disk)."""
+        with self._lock:
+            gone = {normalise_answer(lab) for lab in labels}
+            self._data[question] = [lab for lab in self._data.get(question, []) if normalise_answer(lab) not in gone]
+            self._added[question] = [lab for lab in self._added.get(question, []) if normalise_answer(lab) not in gone]
+            self._retired.setdefault(question, set()).update(gone)
+            self._keys.pop(question, None)
+
+    def flush(self):
+        """Merge this run's changes into the file on disk (locked, atomic). Errors propagate."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not any(self._added.values()) and not any(self._retired.values()):
+                return
+            d = os.path.dirname(self.path) or "."
+            os.makedirs(d, exist_ok=True)
+            with _file_lock(self.path):
+                disk = _read(self.path)
+                for q in set(self._added) | set(self._retired):
+                    gone = self._retired.get(q, set())
+                    merged = [lab for lab in disk.get(q, []) if normalise_answer(lab) not in gone]
+                    seen = {normalise_answer(lab) for lab in merged}
+                    for lab in self._added.get(q, []):
+                        key = normalise_answer(lab)
+                        if key not in seen and key not in gone:
+                            seen.add(key)
+                            merged.append(lab)
+                    disk[q] = merged
+                fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        f.write(_dump(disk))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+            # pick up labels other runs wrote in the meantime
+            self._data = disk
+            self._keys.clear()
+            self._added.clear()
+            self._retired.clear()
+
+    def close(self):
+        self.flush()
@@ -1,12 +1,35 @@
 from __future__ import annotations
+import hashlib
+import itertools
 import json
-from collections import OrderedDict
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import closing, nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import NamedTuple
+import numpy as np
 import pandas as pd
-
-from src.api_client import create_chat, send_message
-from src.utils import make_content, make_batch_content, atomic_save_df
-
-CACHE_FILE = "categories_cache.json"
+import requests
+
+from src.api_client import RateLimitError, create_chat, send_message, stream_message
+from src.utils import (
+    make_content, make_batch_content, make_followup_content, atomic_save_df, normalise_answer, estimate_tokens,
+)
+from src.response_cache import ResponseCache
+from src.categories_cache import CategoriesCache
+from src.checkpoint import CheckpointJournal
+from src.batching import AdaptiveBatcher
+from src.preclassify import PreClassifier
+from src.clustering import cluster_representatives
+from src.metrics import Metrics
+from src.json_stream import ResultsStream
+
+QUARANTINE_MARK = "#QUARANTINED"   # written to rows that keep failing, so they stop blocking the run
+PROVENANCE_SUFFIX = " [Provenance]"
+DRAW_AHEAD = 4   # chunks per in-flight slot drawn ahead of the last in-order commit
 
 def _empty(x) -> bool:
     return (pd.isna(x)) or (isinstance(x, str) and x.strip() == "")
@@ -16,29 +39,47 @@ def _parse_labels(s: str) -> list[str]:
         return []
     return [t.strip() for t in str(s).split(";") if t.strip()]
 
+def _blank_mask(col: pd.Series) -> np.ndarray:
+    """Vectorised _empty() over a whole column."""
+    na = col.isna().to_numpy()
+    stripped = col.where(~na, "").astype(str).str.strip()
+    return na | (stripped == "").to_numpy()
+
 def _seed_categories_from_df(df: pd.DataFrame, code_col_idx: int) -> list[str]:
     """Collect labels present in the codes col so far (dedupe, preserve order)."""
-    seen = OrderedDict()
     col = df.iloc[:, code_col_idx]
-    for v in col:
-        for lab in _parse_labels(v):
-            if lab not in seen:
-                seen[lab] = None
-    return list(seen.keys())
+    # split each distinct cell once; coded columns repeat the same few combinations
+    cells = pd.Series(pd.unique(col[~_blank_mask(col)].astype(str)), dtype=object)
+    labels = cells.str.split(";").explode().str.strip()
+    return list(pd.unique(labels[(labels != "") & (labels != QUARANTINE_MARK)]))
 
-def _load_cache() -> dict:
-    try:
-        with open(CACHE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+class CategoryRegistry:
+    """Insertion-ordered set of labels: O(1) membership, stable prompt order."""
 
-def _save_cache(cache: dict):
-    try:
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
+    def __init__(self, labels=()):
+        self._labels = dict.fromkeys(labels)
+
+    def add(self, label: str) -> bool:
+        if label in self._labels:
+            return False
+        self._labels[label] = None
+        return True
+
+    def update(self, labels):
+        for lab in labels:
+            self.add(lab)
+
+    def __contains__(self, label) -> bool:
+        return label in self._labels
+
+    def __iter__(self):
+        return iter(self._labels)
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def to_list(self) -> list[str]:
+        return list(self._labels)
 
 def _safe_new_col_name(df: pd.DataFrame, base_name: str) -> str:
     """Ensure new column name is unique (e.g., '...[Codes]', '...[Codes] (2)')."""
@@ -55,7 +96,7 @@ def _insert_codes_column_right_of(df: pd.DataFrame, question_col: str, suffix="
     q_idx = df.columns.get_loc(question_col)
     new_col_base = f"{question_col}{suffix}"
     new_col = _safe_new_col_name(df, new_col_base)
-    df.insert(loc=q_idx + 1, column=new_col, value="")
+    df.insert(loc=q_idx + 1, column=new_col, value=pd.Series("", index=df.index, dtype=object))
     return new_col, q_idx + 1
 
 def _find_codes_columns(df: pd.DataFrame, question_col: str, suffix=" [Codes]") -> list[str]:
@@ -67,17 +108,324 @@ def get_or_create_codes_column(df: pd.DataFrame, question_col: str, suffix=" [Co
     codes_cols = _find_codes_columns(df, question_col, suffix=suffix)
     if codes_cols:
         codes_col = max(codes_cols, key=lambda c: df.columns.get_loc(c))
+        # codes are written cell by cell; an Arrow-backed string column copies itself on every write
+        if df[codes_col].dtype != object:
+            df[codes_col] = df[codes_col].astype(object)
         return codes_col, df.columns.get_loc(codes_col), False
     new_col, idx = _insert_codes_column_right_of(df, question_col, suffix=suffix)
     return new_col, idx, True
 
+# ----- provenance: which instruction / model / label set produced each row's codes -----
+
+def provenance_hash(instruction: str, model: str, labels_version: str = "") -> str:
+    """Short stable hash written beside every coded row; changes when any input to the coding changes."""
+    raw = json.dumps([str(instruction), str(model), str(labels_version or "")], ensure_ascii=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+def get_or_create_provenance_column(df: pd.DataFrame, question_col: str, codes_col: str) -> tuple[str, int]:
+    """'<question> [Provenance]', created right of the codes column if missing."""
+    name = f"{question_col}{PROVENANCE_SUFFIX}"
+    if name in df.columns:
+        if df[name].dtype != object:
+            df[name] = df[name].astype(object)
+        return name, df.columns.get_loc(name)
+    idx = df.columns.get_loc(codes_col) + 1
+    df.insert(loc=idx, column=name, value=pd.Series("", index=df.index, dtype=object))
+    return name, idx
+
+def _recode_rows(codes: pd.Series, prov: pd.Series, current: str, stale: bool, labels: list[str] | None) -> np.ndarray:
+    """Coded rows to clear for recoding: stale provenance and/or carrying one of `labels` (case-insensitive)."""
+    coded = ~_blank_mask(codes) & (codes != QUARANTINE_MARK).to_numpy()
+    mask = np.zeros(len(codes), dtype=bool)
+    if stale:
+        mask |= coded & (prov.fillna("").astype(str).str.strip() != current).to_numpy()
+    if labels:
+        wanted = {lab.strip().casefold() for lab in labels}
+        cells = codes[coded]
+        hit = {cell: any(lab.casefold() in wanted for lab in _parse_labels(cell)) for cell in pd.unique(cells)}
+        mask[np.flatnonzero(coded)] |= cells.map(hit).to_numpy(dtype=bool)
+    return np.flatnonzero(mask)
+
 def _blank_row_indices(df: pd.DataFrame, col_idx: int) -> list[int]:
-    return [int(i) for i in df.index if _empty(df.iat[i, col_idx])]
+    return np.flatnonzero(_blank_mask(df.iloc[:, col_idx])).tolist()
 
 def _chunks(seq, n):
     for i in range(0, len(seq), n):
         yield seq[i:i+n]
 
+def _answer_at(answers: pd.Series, row_idx: int) -> str:
+    v = answers.iat[row_idx]
+    return "" if pd.isna(v) else str(v)
+
+class _Chat:
+    """
+    One API chat, used by a single in-flight slot at a time.
+
+    With `compact=True` the first message carries the instruction and the label
+    table and later ones only the answers plus labels this chat has not seen.
+    Once the conversation passes `max_context_tokens` (estimated), the next
+    message opens a fresh chat, which gets the full prompt again.
+    """
+
+    def __init__(self, model: str, name: str, *, compact: bool = False, max_context_tokens: int = 16000,
+                 metrics: Metrics | None = None):
+        self.model = model
+        self.name = name
+        self.compact = compact
+        self.max_context_tokens = max_context_tokens
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.messages = self.prompt_tokens = self.rotations = self.rows_sent = 0
+        self._open()
+
+    def _open(self):
+        with self.metrics.timer("create_chat"):
+            self.id = create_chat(model=self.model, name=self.name)
+        self.primed_as: str | None = None   # "single" | "batch": the prompt format this chat was given
+        self.known_labels = 0               # categories[:known_labels] are already in this chat
+        self.context_tokens = 0
+
+    def send(self, instruction: str, question_col: str, items: list[dict], categories: list[str], batched: bool,
+             on_text=None) -> str:
+        """Send one coding message and return the reply text; with `on_text` the reply is streamed to it as it arrives."""
+        kind = "batch" if batched else "single"
+        if self.compact and self.primed_as and self.context_tokens >= self.max_context_tokens:
+            self._open()
+            self.rotations += 1
+            self.metrics.add("chat_rotations")
+        with self.metrics.timer("prompt_build"):
+            if self.compact and self.primed_as == kind:
+                delta = categories[self.known_labels:]
+                content = (make_followup_content(delta, items=items) if batched
+                           else make_followup_content(delta, answer=items[0]["answer"]))
+            else:
+                # full prompt; the session note only goes into a chat's first message
+                note = self.compact and self.primed_as is None
+                content = (make_batch_content(instruction, question_col, items, categories, session_note=note) if batched
+                           else make_content(instruction, question_col, items[0]["answer"], categories, session_note=note))
+        with self.metrics.timer("send_message"):
+            opts = dict(cloak=True, params={"temperature": 0}, properties={"source": "pandas-llm-batch-categoriser"})
+            if on_text is not None:
+                parts = []
+                # closing(): an on_text error still ends the stream and frees its rate-limiter slot now
+                with closing(stream_message(self.id, content, **opts)) as pieces:
+                    for piece in pieces:
+                        parts.append(piece)
+                        on_text(piece)
+                reply = "".join(parts)
+            else:
+                resp = send_message(self.id, content, streaming=False, **opts)
+                reply = (resp.get("response", {}) or {}).get("content", "")
+        tokens = estimate_tokens(content)
+        self.messages += 1
+        self.rows_sent += len(items)
+        self.prompt_tokens += tokens
+        self.metrics.add("api_messages")
+        self.metrics.add("prompt_bytes", len(content.encode("utf-8")))
+        self.metrics.add("response_bytes", len(str(reply).encode("utf-8")))
+        if self.compact:
+            self.context_tokens += tokens + estimate_tokens(str(reply))
+            self.primed_as = self.primed_as or kind
+            if self.primed_as == kind:
+                self.known_labels = len(categories)
+        return reply
+
+def _code_group(
+    chat: _Chat,
+    question_col: str,
+    instruction: str,
+    items: list[dict],
+    categories: list[str],
+    batch_size: int,
+    on_row=None,
+) -> tuple[list[tuple[int, str]], bool]:
+    """
+    Send one chunk of rows to the API and return ([(row, codes)], parsed_ok).
+    Never touches the DataFrame, so it is safe to run in a worker thread.
+
+    With `on_row` a batched reply is streamed: each result is parsed as soon as
+    its object is complete and passed to on_row(row, codes). If the stream breaks
+    after some rows arrived, those rows are returned (parsed_ok=False) instead of
+    raising, and only the rest need resending.
+    """
+    t_sent = time.perf_counter()
+    if batch_size == 1:
+        # ----- single-row path (legacy) -----
+        item = items[0]
+        response = chat.send(instruction, question_col, items, categories, batched=False)
+        with chat.metrics.timer("json_parse"):
+            try:
+                obj = json.loads(response) if str(response).strip().startswith("{") else {"categories": str(response).strip()}
+                cat_str = str(obj.get("categories", "")).strip()
+            except Exception:
+                cat_str = str(response).strip()
+
+        # 🔹 Clean up any "NEW:" prefixes before saving
+        cat_str = "; ".join([c.strip().removeprefix("NEW:").strip() for c in cat_str.split(";") if c.strip()])
+        chat.metrics.observe("first_row", time.perf_counter() - t_sent)
+        return [(item["row"], cat_str)], True
+
+    # ----- batched path -----
+    rows = {it["row"] for it in items}
+    if on_row is not None:
+        parser = ResultsStream()
+        streamed: dict[int, str] = {}
+
+        def _take(piece: str):
+            for res in parser.feed(piece):
+                got = _result_row(res, rows)
+                if got is None or got[0] in streamed:
+                    continue
+                if not streamed:
+                    chat.metrics.observe("first_row", time.perf_counter() - t_sent)
+                streamed[got[0]] = got[1]
+                if not _empty(got[1]):
+                    on_row(*got)
+
+        try:
+            raw = chat.send(instruction, question_col, items, categories, batched=True, on_text=_take).strip()
+        except Exception:
+            if not streamed:
+                raise
+            chat.metrics.add("streams_cut")
+            return list(streamed.items()), False
+        try:
+            json.loads(raw)
+            parsed_ok = True
+        except Exception:
+            parsed_ok = False
+        return list(streamed.items()), parsed_ok
+
+    raw = chat.send(instruction, question_col, items, categories, batched=True).strip()
+
+    # Parse strict JSON: {"results":[{"row":<int>, "categories":"..."}]}
+    results = []
+    parsed_ok = True
+    t0 = time.perf_counter()
+    try:
+        parsed = json.loads(raw)
+        results = parsed.get("results", [])
+    except Exception:
+        # Fallback: try to detect a JSON list directly
+        try:
+            maybe_list = json.loads(raw)
+            if isinstance(maybe_list, list):
+                results = maybe_list
+        except Exception:
+            # unparseable: let the caller bisect and resend rather than write raw text into rows
+            parsed_ok = False
+    chat.metrics.observe("json_parse", time.perf_counter() - t0)
+
+    out = [got for res in results if (got := _result_row(res, rows)) is not None]
+    if out:
+        chat.metrics.observe("first_row", time.perf_counter() - t_sent)
+    return out, parsed_ok
+
+def _result_row(res, rows: set[int]) -> tuple[int, str] | None:
+    """(row, codes) from one {"row": .., "categories": ..} result, if it is for one of `rows`."""
+    try:
+        r = int(res["row"])
+        cat_str = str(res.get("categories", "")).strip()
+    except Exception:
+        return None
+    return (r, cat_str) if r in rows else None
+
+def _with_retries(fn, retries: int, base_delay: float = 1.0, max_delay: float = 30.0, on_retry=None):
+    """
+    Call fn(); on error retry up to `retries` times with exponential backoff + full jitter.
+    RateLimitError is raised at once: the client has already retried that 429/5xx itself.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except RateLimitError:
+            raise
+        except Exception:
+            if attempt >= retries:
+                raise
+            if on_retry is not None:
+                on_retry()
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+def _is_outage(e: Exception) -> bool:
+    """Throttling, 5xx or a dropped connection: says nothing about the rows that were sent."""
+    return isinstance(e, (RateLimitError, requests.RequestException))
+
+class _Outcome(NamedTuple):
+    results: list[tuple[int, str]]   # rows that came back with codes
+    failed: list[int]                # rows whose reply was missing or unparseable (count towards quarantine)
+    first_returned: int              # rows returned by the first request (batcher feedback)
+    first_parsed: bool               # whether the first reply parsed
+    error: Exception | None = None   # an outage stopped the chunk; its unsent rows stay pending
+
+def _code_rows(
+    chat: _Chat,
+    question_col: str,
+    instruction: str,
+    items: list[dict],
+    categories: list[str],
+    batch_size: int,
+    retries: int,
+    on_row=None,
+) -> _Outcome:
+    """
+    Code one chunk with per-request retries. In the batched path, rows missing from
+    the reply (or an unparseable reply) are bisected and only those halves are resent;
+    a lone missing row falls back to the single-row prompt. Runs in a worker thread.
+    `on_row` streams batched replies (see _code_group). An outage (see _is_outage)
+    stops the chunk: rows not yet coded are neither results nor failures.
+    """
+    if batch_size == 1:
+        try:
+            results, _ = _with_retries(
+                lambda: _code_group(chat, question_col, instruction, items, categories, 1), retries,
+                on_retry=lambda: chat.metrics.add("retries"))
+        except Exception as e:
+            if _is_outage(e):
+                return _Outcome([], [], 0, True, e)
+            return _Outcome([], [it["row"] for it in items], 0, False)
+        results = [(r, c) for r, c in results if not _empty(c)]
+        failed = [it["row"] for it in items if it["row"] not in {r for r, _ in results}]
+        return _Outcome(results, failed, len(results), True)
+
+    results, failed = [], []
+    first = None
+    stack = [(items, False)]    # (part, use single-row prompt)
+    while stack:
+        part, single = stack.pop()
+        try:
+            got, parsed_ok = _with_retries(
+                lambda: _code_group(chat, question_col, instruction, part, categories, 1 if single else batch_size,
+                                    on_row),
+                retries,
+                on_retry=lambda: chat.metrics.add("retries"),
+            )
+        except Exception as e:
+            if _is_outage(e):
+                return _Outcome(results, failed, *(first or (0, True)), e)
+            if first is None:
+                first = (0, False)
+            failed.extend(it["row"] for it in part)
+            continue
+        # an unparseable reply yields no rows, except results that streamed in whole before it broke
+        got = [(r, c) for r, c in got if not _empty(c)]
+        if first is None:
+            first = (len(got), parsed_ok)
+        results.extend(got)
+
+        done = {r for r, _ in got}
+        missing = [it for it in part if it["row"] not in done]
+        if not missing:
+            continue
+        if single:
+            failed.extend(it["row"] for it in missing)
+        elif len(missing) == 1:
+            stack.append((missing, True))
+        else:
+            mid = len(missing) // 2
+            stack.append((missing[mid:], False))
+            stack.append((missing[:mid], False))
+    return _Outcome(results, failed, *first)
+
 def run_categorisation_for_question(
     df: pd.DataFrame,
     question_col: str,
@@ -88,145 +436,439 @@ def run_categorisation_for_question(
     autosave_every_pass: bool = True,
     batch_size: int = 1,                    # <-- NEW
     verbose: bool = True,                   # <-- optional prints
+    concurrency: int = 1,                   # requests kept in flight
+    response_cache: ResponseCache | None = None,
+    preclassifier: PreClassifier | None = None,  # local rules tried before the API
+    cluster_threshold: float = 0.0,         # >0: send one answer per cluster of near-paraphrases
+    compact_prompts: bool = False,          # instruction + labels once per chat, then answers + label deltas
+    max_context_tokens: int = 16000,        # compact mode: start a fresh chat past this many (estimated) tokens
+    metrics: Metrics | None = None,         # stage timings + counters for the run report
+    labels_version: str = "",               # bump (config "labels_version") to mark every row's codes stale
+    recode_stale: bool = False,             # recode rows whose provenance is not the current one
+    recode_labels: list[str] | None = None, # recode rows carrying any of these labels
+    categories_cache: CategoriesCache | None = None,  # label lists carried between runs (default categories_cache.json)
+    stream_responses: bool = False,         # batched: stream replies and store each row as its result completes
+    journal: CheckpointJournal | None = None,   # append results here instead of rewriting the CSV
+    journal_row_offset: int = 0,            # global row number of df's first row (chunked input)
+    batch_token_budget: int = 0,            # >0: pack batches by estimated prompt tokens, adapting size
+    max_retries: int = 3,                   # per-request retries (backoff + jitter) before a row counts as failed
+    max_row_attempts: int = 3,              # failed attempts before a row is marked QUARANTINE_MARK
+    max_pass_aborts: int = 6,               # aborted passes in a row (e.g. an outage) before the rest is left for a rerun
+    retry_quarantined: bool = False,        # treat previously quarantined rows as blank again
+    df_lock: threading.Lock | None = None,  # shared when several questions write into one df
+    progress=None,                          # optional callback(done_rows, total_rows)
+    log=print,                              # where summary/abort messages go
 ) -> str:
-    # get/create [Codes] column to the right
-    codes_col_name, codes_col_idx, _created = get_or_create_codes_column(df, question_col, suffix=" [Codes]")
-
+    lock = df_lock if df_lock is not None else nullcontext()
+    metrics = metrics if metrics is not None else Metrics()
+    started = time.perf_counter()
+    concurrency = max(1, concurrency)
     cache_key = question_col
-    cache = _load_cache()
-    categories = _seed_categories_from_df(df, codes_col_idx)
-    for c in cache.get(cache_key, []):
-        if c not in categories:
-            categories.append(c)
+    store = categories_cache if categories_cache is not None else CategoriesCache()
+
+    provenance = provenance_hash(instruction, model, labels_version)
+    with lock:
+        # get/create [Codes] column to the right, and [Provenance] right of that
+        codes_col_name, codes_col_idx, _created = get_or_create_codes_column(df, question_col, suffix=" [Codes]")
+        _prov_name, prov_col_idx = get_or_create_provenance_column(df, question_col, codes_col_name)
+        answer_col = df[question_col].copy()   # read-only from here on, no lock needed
+        recode = np.array([], dtype=int)
+        if recode_stale or recode_labels:
+            recode = _recode_rows(df.iloc[:, codes_col_idx], df.iloc[:, prov_col_idx], provenance,
+                                  recode_stale, recode_labels)
+            # cleared before seeding, so labels only these rows carried are not offered again
+            df.iloc[recode, codes_col_idx] = ""
+            df.iloc[recode, prov_col_idx] = ""
+        # seeded once; from here on the registry and the pending index are kept
+        # in step with every write, so a pass never rescans finished rows
+        categories = CategoryRegistry(_seed_categories_from_df(df, codes_col_idx))
+        pending = dict.fromkeys(_blank_row_indices(df, codes_col_idx))   # ordered set of blank rows
+        if retry_quarantined:
+            quarantined = np.flatnonzero((df.iloc[:, codes_col_idx] == QUARANTINE_MARK).to_numpy())
+            pending.update(dict.fromkeys(quarantined.tolist()))
+    categories.update(store.get(cache_key))
+    if recode_labels:
+        retired = {lab.strip().casefold() for lab in recode_labels}
+        categories = CategoryRegistry(lab for lab in categories if lab.casefold() not in retired)
+        store.retire(cache_key, recode_labels)
+    if len(recode):
+        log(f"   Recode: cleared {len(recode)} coded rows"
+            + (" with stale provenance" if recode_stale else "")
+            + (" or" if recode_stale and recode_labels else "")
+            + (f" carrying {', '.join(recode_labels)}" if recode_labels else ""))
+    if preclassifier is not None:
+        preclassifier.add_labels(categories)
+    total_rows = len(pending)
+    row_failures: dict[int, int] = {}
+    quarantined_rows = 0
+
+    # adaptive batching only applies to the batched path; batch_size becomes the item cap
+    batcher = None
+    if batch_token_budget > 0 and batch_size > 1:
+        batcher = AdaptiveBatcher(batch_token_budget, batch_size)
 
     def _has_blanks() -> bool:
-        return any(_empty(v) for v in df.iloc[:, codes_col_idx])
+        return bool(pending)
+
+    early_journaled: set[int] = set()   # streamed rows already in the journal ahead of their commit
+    rows_early = 0
+
+    def _write(r: int, cat_str: str):
+        coded = not _empty(cat_str)
+        with lock:
+            df.iat[r, codes_col_idx] = cat_str
+            df.iat[r, prov_col_idx] = provenance if coded else ""
+        if coded:
+            pending.pop(r, None)
+            if journal is not None and r not in early_journaled:
+                journal.record(question_col, journal_row_offset + r, cat_str, provenance)
+            early_journaled.discard(r)
+        # update categories list
+        categories.update(_parse_labels(cat_str))
+
+    # identical answers: representative row -> rows with the same normalised answer
+    followers: dict[int, list[int]] = {}
+    # near-paraphrases: cluster medoid row -> other representatives that take its label
+    similar: dict[int, list[int]] = {}
+    rows_blank = tokens_saved = clustered_rows = 0
+    sent_rows: set[int] = set()   # distinct rows put in a prompt; the chats count every send, re-sends included
+    cache_lookups = cache_hits = 0
+    local_hits: dict[str, int] = {}   # pre-classifier rule -> rows coded locally
+
+    def _collapse_duplicates(blanks: list[int]) -> list[int]:
+        """Group blank rows by normalised answer; return one representative row per answer."""
+        nonlocal tokens_saved
+        followers.clear()
+        groups: dict[str, list[int]] = {}
+        for r in blanks:
+            groups.setdefault(normalise_answer(answer_col.iat[r]), []).append(r)
+
+        # what each duplicate would have cost: a whole prompt when sent alone, one item when batched
+        per_row = estimate_tokens(make_content(instruction, question_col, "", categories)) if batch_size == 1 else 8
+        reps = []
+        for rows in groups.values():
+            rep, *rest = rows
+            followers[rep] = rest
+            reps.append(rep)
+            if rest:
+                tokens_saved += len(rest) * (per_row + estimate_tokens(_answer_at(answer_col, rep)))
+        return reps
+
+    def _resolve_locally(reps: list[int]) -> list[int]:
+        """Code representatives the pre-classifier is confident about; return the rest."""
+        to_send = []
+        for r in reps:
+            hit = preclassifier.match(answer_col.iat[r])
+            if hit is None:
+                to_send.append(r)
+                continue
+            codes, rule = hit
+            rows = (r, *followers.pop(r))
+            local_hits[rule] = local_hits.get(rule, 0) + len(rows)
+            for row in rows:
+                _write(row, codes)
+        return to_send
+
+    def _cluster(reps: list[int]) -> list[int]:
+        """Keep cluster medoids and outliers; park the other members under their medoid."""
+        similar.clear()
+        if len(reps) < 2:
+            return reps
+        by_freq = sorted(reps, key=lambda r: -len(followers[r]))   # common answers lead clusters
+        medoid = cluster_representatives([normalise_answer(answer_col.iat[r]) for r in by_freq], cluster_threshold)
+        for i, r in enumerate(by_freq):
+            if medoid[i] != i:
+                similar.setdefault(by_freq[medoid[i]], []).append(r)
+        parked = {m for members in similar.values() for m in members}
+        return [r for r in reps if r not in parked]
+
+    def _resolve_from_cache(reps: list[int]) -> list[int]:
+        """Fill representatives (and their duplicates) from the response cache; return the misses."""
+        nonlocal cache_lookups, cache_hits
+        to_send = []
+        for r in reps:
+            n = 1 + len(followers[r])
+            cache_lookups += n
+            codes = response_cache.get(ResponseCache.make_key(question_col, instruction, model, answer_col.iat[r], labels_version))
+            if codes is None:
+                to_send.append(r)
+                continue
+            cache_hits += n
+            for row in (r, *followers.pop(r)):
+                _write(row, codes)
+        return to_send
+
+    def _write_early(r: int, cat_str: str):
+        """
+        A streamed result, before its batch has finished: store and journal its codes
+        (and its duplicates') now. Labels, the cache and counters are still updated by
+        the in-order _commit, so the categories list does not depend on timing.
+        """
+        nonlocal rows_early
+        rows = [r, *followers.get(r, [])]
+        for m in similar.get(r, []):
+            rows += [m, *followers.get(m, [])]
+        with lock:
+            for row in rows:
+                df.iat[row, codes_col_idx] = cat_str
+                df.iat[row, prov_col_idx] = provenance
+        if journal is not None:
+            for row in rows:
+                journal.record(question_col, journal_row_offset + row, cat_str, provenance)
+            early_journaled.update(rows)
+        rows_early += len(rows)
+
+    def _quarantine(r: int):
+        nonlocal quarantined_rows
+        similar.pop(r, None)   # paraphrases stay pending and get another medoid next pass
+        for row in (r, *followers.pop(r, [])):
+            with lock:
+                df.iat[row, codes_col_idx] = QUARANTINE_MARK
+            pending.pop(row, None)
+            if journal is not None:
+                journal.record(question_col, journal_row_offset + row, QUARANTINE_MARK)
+            quarantined_rows += 1
+
+    def _commit(items: list[dict], results: list[tuple[int, str]], failed: list[int]):
+        """Write one chunk's results back. Only ever called from this thread."""
+        nonlocal clustered_rows
+        answers = {it["row"]: it["answer"] for it in items}
+        for r in failed:
+            row_failures[r] = row_failures.get(r, 0) + 1
+            if row_failures[r] >= max_row_attempts:
+                _quarantine(r)
+            if verbose:
+                print(f"[row {r} failed ({row_failures[r]}/{max_row_attempts})"
+                      f"{' - quarantined' if row_failures[r] >= max_row_attempts else ''}]")
+        for r, cat_str in results:
+            # write cleaned string back into DataFrame
+            _write(r, cat_str)
+            for f in followers.pop(r, []):
+                _write(f, cat_str)
+            for m in similar.pop(r, []):
+                for row in (m, *followers.pop(m, [])):
+                    _write(row, cat_str)
+                    clustered_rows += 1
+            if response_cache is not None:
+                response_cache.put(ResponseCache.make_key(question_col, instruction, model, answers[r], labels_version), cat_str)
+
+            if verbose:
+                print("\n----------------------")
+                print(f"Q: {question_col}")
+                print(f"Row: {r}")
+                print(f"A: {answers[r]}")
+                print(f"LLM: {cat_str}")
+                print("----------------------\n")
+
+    chats: list[_Chat] = []
+    all_chats: list[_Chat] = []   # for the prompt-size summary
+    aborts = 0
 
     while _has_blanks():
-        chat_id = create_chat(model=model, name=f"coding:{question_col}")
-
-        # refresh category seed each pass
-        seeded = _seed_categories_from_df(df, codes_col_idx)
-        for c in seeded:
-            if c not in categories:
-                categories.append(c)
+        pass_failures = 0
 
         try:
-            # Work over BLANK rows only, in batches
-            blanks = _blank_row_indices(df, codes_col_idx)
-            for group in _chunks(blanks, max(1, batch_size)):
-                if batch_size == 1:
-                    # ----- single-row path (legacy) -----
-                    row_idx = group[0]
-                    ans = "" if pd.isna(df.at[row_idx, question_col]) else str(df.at[row_idx, question_col])
-                    content_str = make_content(instruction, question_col, ans, categories)
-                    resp = send_message(
-                        chat_id,
-                        content_str,
-                        streaming=False,
-                        cloak=True,
-                        params={"temperature": 0},
-                        properties={"source": "pandas-llm-batch-categoriser"},
-                    )
-                    response = (resp.get("response", {}) or {}).get("content", "")
-                    try:
-                        obj = json.loads(response) if str(response).strip().startswith("{") else {"categories": str(response).strip()}
-                        cat_str = str(obj.get("categories", "")).strip()
-                    except Exception:
-                        cat_str = str(response).strip()
-
-                    # 🔹 Clean up any "NEW:" prefixes before saving
-                    cat_str = "; ".join([c.strip().removeprefix("NEW:").strip() for c in cat_str.split(";") if c.strip()])
-
-                    # write cleaned string back into DataFrame
-                    df.iat[row_idx, codes_col_idx] = cat_str
-
-                    # update categories list
-                    for c in _parse_labels(cat_str):
-                        if c not in categories:
-                            categories.append(c)
-
-
-                    if verbose:
-                        print("\n----------------------")
-                        print(f"Q: {question_col}")
-                        print(f"Row: {row_idx}")
-                        print(f"A: {ans}")
-                        print(f"LLM: {cat_str}")
-                        print("----------------------\n")
-
-                else:
-                    # ----- batched path -----
-                    items = []
-                    for r in group:
-                        a = "" if pd.isna(df.at[r, question_col]) else str(df.at[r, question_col])
-                        items.append({"row": int(r), "answer": a})
-
-                    content_str = make_batch_content(instruction, question_col, items, categories)
-                    resp = send_message(
-                        chat_id,
-                        content_str,
-                        streaming=False,
-                        cloak=True,
-                        params={"temperature": 0},
-                        properties={"source": "pandas-llm-batch-categoriser"},
-                    )
-                    raw = (resp.get("response", {}) or {}).get("content", "").strip()
-
-                    # Parse strict JSON: {"results":[{"row":<int>, "categories":"..."}]}
-                    results = []
-                    try:
-                        parsed = json.loads(raw)
-                        results = parsed.get("results", [])
-                    except Exception:
-                        # Fallback: try to detect a JSON list directly
-                        try:
-                            maybe_list = json.loads(raw)
-                            if isinstance(maybe_list, list):
-                                results = maybe_list
-                        except Exception:
-                            # Last resort: treat the whole batch as one string (not ideal)
-                            results = [{"row": it["row"], "categories": str(raw)} for it in items]
-
-                    # Write back results
-                    for res in results:
-                        try:
-                            r = int(res["row"])
-                            cat_str = str(res.get("categories", "")).strip()
-                        except Exception:
-                            continue
-                        if r in group:
-                            df.iat[r, codes_col_idx] = cat_str
-                            for c in _parse_labels(cat_str):
-                                if c not in categories:
-                                    categories.append(c)
-
-                            if verbose:
-                                ans = "" if pd.isna(df.at[r, question_col]) else str(df.at[r, question_col])
-                                print("\n----------------------")
-                                print(f"Q: {question_col}")
-                                print(f"Row: {r}")
-                                print(f"A: {ans}")
-                                print(f"LLM: {cat_str}")
-                                print("----------------------\n")
+            # Work over BLANK rows only, in batches. Up to `concurrency` chunks are in
+            # flight at once; finished chunks are buffered and committed in order. Chunk k
+            # is drawn (rows and categories list) right after chunk k - ahead is committed,
+            # so prompts do not depend on which response arrives first, while a chunk
+            # stuck retrying leaves `ahead` - 1 others free to go out on the other chats.
+            blanks = list(pending)
+            rows_blank = rows_blank or len(blanks)
+            blanks = _collapse_duplicates(blanks)
+            if preclassifier is not None:
+                with metrics.timer("preclassify"):
+                    blanks = _resolve_locally(blanks)
+            # recoding by label: same instruction, so the cache would hand back the labels being recoded
+            if response_cache is not None and not recode_labels:
+                with metrics.timer("response_cache"):
+                    blanks = _resolve_from_cache(blanks)
+            if cluster_threshold > 0:
+                with metrics.timer("cluster"):
+                    blanks = _cluster(blanks)
+
+            # rows that failed before are sent alone, so one bad answer cannot sink a batch
+            retrying = [r for r in blanks if r in row_failures]
+            blanks = [r for r in blanks if r not in row_failures]
+            if batcher is not None:
+                groups = batcher.batches(
+                    blanks,
+                    lambda r: _answer_at(answer_col, r),
+                    # compact chats resend only answers, so the budget is nearly all answers
+                    (lambda: estimate_tokens(make_followup_content([], items=[]))) if compact_prompts
+                    else (lambda: estimate_tokens(make_batch_content(instruction, question_col, [], categories))),
+                )
+            else:
+                groups = _chunks(blanks, max(1, batch_size))
+            groups = itertools.chain(groups, ([r] for r in retrying))
+            # streamed rows arrive here from worker threads; only this thread touches df
+            early = queue.SimpleQueue() if stream_responses and batch_size > 1 else None
+            ahead = DRAW_AHEAD * concurrency
+            in_flight = {}    # future -> seq
+            ready = deque()   # (seq, items, categories snapshot): drawn, waiting for a free chat
+            sent = {}         # seq -> items
+            finished = {}     # seq -> _Outcome, waiting for earlier chunks
+            outage = None     # first throttle/transport error; ends the pass once what came back is committed
+            next_seq = next_commit = 0
+            free_chats = list(chats)
+
+            def _draw():
+                """Take the next group and the categories list as it stands now, both fixed by commit order."""
+                nonlocal next_seq
+                group = next(groups, None)
+                if group is None:
+                    return
+                items = [{"row": int(r), "answer": _answer_at(answer_col, r)} for r in group]
+                sent_rows.update(group)
+                ready.append((next_seq, items, categories.to_list()))
+                next_seq += 1
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                def _send():
+                    """Put drawn groups on free chats (never two in flight on one conversation)."""
+                    while ready and (free_chats or len(chats) < concurrency):
+                        if not free_chats:
+                            # opened on first use, so a pass the caches answered opens none;
+                            # replaced only after a pass that saw failures
+                            chats.append(_Chat(model, f"coding:{question_col}", compact=compact_prompts,
+                                               max_context_tokens=max_context_tokens, metrics=metrics))
+                            all_chats.append(chats[-1])
+                            free_chats.append(chats[-1])
+                        seq, items, labels = ready.popleft()
+                        chat = free_chats.pop()
+                        fut = pool.submit(
+                            _code_rows, chat, question_col, instruction,
+                            items, labels, batch_size, max_retries,
+                            None if early is None else (lambda r, c: early.put((r, c))),
+                        )
+                        in_flight[fut] = (seq, chat)
+                        sent[seq] = items
+
+                try:
+                    for _ in range(ahead):
+                        _draw()
+                    _send()
+                    while in_flight:
+                        done, _ = wait(in_flight, timeout=None if early is None else 0.05, return_when=FIRST_COMPLETED)
+                        # before the finished futures: a chunk's streamed rows are all queued by the time it is done
+                        while early is not None and not early.empty():
+                            _write_early(*early.get())
+                        for fut in done:
+                            seq, chat = in_flight.pop(fut)
+                            free_chats.append(chat)
+                            outcome = fut.result()
+                            pass_failures += len(outcome.failed)
+                            outage = outage or outcome.error
+                            finished[seq] = outcome
+
+                        while next_commit in finished:
+                            outcome = finished.pop(next_commit)
+                            items = sent.pop(next_commit)
+                            if batcher is not None and outcome.error is None:
+                                batcher.record(len(items), outcome.first_returned, outcome.first_parsed)
+                            with metrics.timer("df_write"):
+                                _commit(items, outcome.results, outcome.failed)
+                            next_commit += 1
+                            _draw()   # chunk next_commit - 1 + ahead
+                        if outage is None:
+                            _send()
+                        if progress is not None:
+                            progress(total_rows - len(pending), total_rows)
+                        if outage is not None:
+                            raise outage   # the finally below keeps whatever already came back
+                finally:
+                    for fut in in_flight:
+                        fut.cancel()
+                    # keep whatever already came back before an abort
+                    for seq in sorted(finished):
+                        _commit(sent[seq], finished[seq].results, finished[seq].failed)
 
         except Exception as e:
-            # persist on failure then retry pass
-            cache[cache_key] = categories
-            _save_cache(cache)
-            if output_path:
-                atomic_save_df(df, output_path)
-            print(f"[pass aborted for '{question_col}'] {e} — restarting pass...")
+            # persist on failure then retry pass, backing off so an outage is not a hot loop
+            try:
+                store.update(cache_key, categories.to_list())
+            except (OSError, ValueError) as err:
+                log(f"[categories cache not saved: {err}]")
+            with metrics.timer("checkpoint_save"):
+                if journal is not None:
+                    journal.sync()
+                elif output_path:
+                    with lock:
+                        atomic_save_df(df, output_path)
+            aborts += 1
+            metrics.add("pass_aborts")
+            if aborts >= max_pass_aborts:
+                # rows are left blank, not quarantined: nothing says their content is the problem
+                log(f"[giving up on '{question_col}' after {aborts} aborted passes] {e} — "
+                    f"{len(pending)} rows left blank for the next run")
+                break
+            delay = random.uniform(0, min(60.0, 2 ** aborts))
+            log(f"[pass aborted for '{question_col}'] {e} — restarting pass in {delay:.1f}s...")
+            chats = []
+            time.sleep(delay)
             continue
 
+        aborts = 0
+        if pass_failures:
+            chats = []
+        store.update(cache_key, categories.to_list())   # written out at most every flush_interval
+
         # end of pass
         if autosave_every_pass and output_path:
-            atomic_save_df(df, output_path)
+            with metrics.timer("checkpoint_save"), lock:
+                atomic_save_df(df, output_path)
 
     # final persist
-    cache[cache_key] = categories
-    _save_cache(cache)
-    if output_path:
-        atomic_save_df(df, output_path)
+    store.update(cache_key, categories.to_list())
+    store.flush()
+    if progress is not None:
+        progress(total_rows - len(pending), total_rows)
+    rows_sent = len(sent_rows)
+    rows_resent = max(0, sum(c.rows_sent for c in all_chats) - rows_sent)
+    log(f"   Dedup: {rows_blank} blank rows -> {rows_sent} sent to the API (~{tokens_saved} prompt tokens saved)"
+        + (f"; plus {rows_resent} re-sends of rows whose request failed or was split" if rows_resent else ""))
+    n_msgs = sum(c.messages for c in all_chats)
+    if n_msgs:
+        prompt_tokens = sum(c.prompt_tokens for c in all_chats)
+        log(f"   Prompts: {n_msgs} messages, ~{prompt_tokens} tokens (~{prompt_tokens / max(1, rows_sent + rows_resent):.0f} per row sent)"
+            + (f", {sum(c.rotations for c in all_chats)} chat rotations" if compact_prompts else ""))
+    if preclassifier is not None:
+        n_local = sum(local_hits.values())
+        rate = (n_local / rows_blank * 100) if rows_blank else 0.0
+        detail = ", ".join(f"{rule} {n}" for rule, n in local_hits.items())
+        log(f"   Pre-classifier: {n_local}/{rows_blank} rows coded locally ({rate:.1f}%){f' — {detail}' if detail else ''}")
+    if stream_responses and batch_size > 1:
+        n_cut = int(metrics.count("streams_cut"))
+        log(f"   Streaming: {rows_early} rows stored as their results streamed in"
+            + (f"; {n_cut} replies cut off midway kept their finished rows (run total)" if n_cut else ""))
+    if cluster_threshold > 0:
+        log(f"   Clustering: {clustered_rows} rows took the codes of a similar answer (threshold {cluster_threshold})")
+    if response_cache is not None:
+        response_cache.flush()
+        rate = (cache_hits / cache_lookups * 100) if cache_lookups else 0.0
+        log(f"   Response cache: {cache_hits}/{cache_lookups} rows served from cache ({rate:.1f}%)")
+    if quarantined_rows:
+        log(f"   Quarantined: {quarantined_rows} rows marked {QUARANTINE_MARK} after {max_row_attempts} failed attempts")
+    if batcher is not None:
+        log(f"   Adaptive batches: ended at {batcher.limit} rows/request "
+              f"({batcher.shrinks} shrinks, {batcher.grows} grows)")
+    with metrics.timer("checkpoint_save"):
+        if journal is not None:
+            journal.sync()
+        if output_path:
+            with lock:
+                atomic_save_df(df, output_path)
 
+    rows_coded = total_rows - len(pending) - quarantined_rows
+    n_local = sum(local_hits.values())
+    for name, n in (("rows_coded", rows_coded), ("rows_recoded", len(recode)), ("rows_streamed_early", rows_early), ("rows_sent", rows_sent), ("rows_resent", rows_resent), ("rows_local", n_local),
+                    ("rows_clustered", clustered_rows), ("cache_hits", cache_hits),
+                    ("cache_lookups", cache_lookups), ("rows_quarantined", quarantined_rows)):
+        metrics.add(name, n)
+    elapsed = time.perf_counter() - started
+    metrics.question(
+        question_col, rows_blank=rows_blank, rows_coded=rows_coded, rows_recoded=len(recode), rows_sent=rows_sent, rows_resent=rows_resent, rows_local=n_local,
+        rows_clustered=clustered_rows, cache_hits=cache_hits, quarantined=quarantined_rows,
+        seconds=round(elapsed, 3),
+    )
     return codes_col_name
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of coded rows: {"q": <question>, "row": <int>, "codes": <str>, "p": <provenance>}.
+
+    Each result is appended as it is written to the DataFrame, so progress
+    survives a crash without rewriting the whole CSV. Lines are flushed to the
+    OS immediately and fsync'd at most every `sync_interval` seconds.
+    """
+
+    def __init__(self, path: str, sync_interval: float = 5.0):
+        self.path = path
+        self.sync_interval = max(0.0, sync_interval)
+        self._lock = threading.Lock()
+        self._f = open(path, "a", encoding="utf-8")
+        self._last_sync = time.monotonic()
+
+    def record(self, question: str, row: int, codes: str, provenance: str | None = None):
+        rec = {"q": question, "row": int(row), "codes": codes}
+        if provenance:
+            rec["p"] = provenance
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            if time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._f.fileno())
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._f.flush()
+            self._sync()
+
+    def truncate(self):
+        """Drop every record, e.g. once they are safely in the output."""
+        with self._lock:
+            self._f.seek(0)
+            self._f.truncate()
+            self._f.flush()
+            self._sync()
+
+    def close(self, remove: bool = False):
+        """Sync and close; `remove=True` once the full output has been saved."""
+        with self._lock:
+            if not self._f.closed:
+                self._f.flush()
+                self._sync()
+                self._f.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+def load_journal(path: str) -> dict[str, dict[int, tuple[str, str]]]:
+    """{question: {row: (codes, provenance)}} with the last write winning; a torn final line is ignored."""
+    out: dict[str, dict[int, tuple[str, str]]] = {}
+    if not os.path.exists(path):
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                out.setdefault(rec["q"], {})[int(rec["row"])] = (str(rec["codes"]), str(rec.get("p", "")))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return out
+
+def replay_journal(df: pd.DataFrame, path: str, row_offset: int = 0) -> int:
+    """
+    Apply a journal onto a freshly loaded DataFrame; returns rows restored.
+    `row_offset` is the global row number of df's first row (for chunked input).
+    """
+    from src.categoriser import get_or_create_codes_column, get_or_create_provenance_column
+
+    restored = 0
+    for question_col, rows in load_journal(path).items():
+        if question_col not in df.columns:
+            continue
+        rows = {r - row_offset: v for r, v in rows.items() if row_offset <= r < row_offset + len(df)}
+        if not rows:
+            continue
+        codes_col, _, _ = get_or_create_codes_column(df, question_col, suffix=" [Codes]")
+        _, prov_col_idx = get_or_create_provenance_column(df, question_col, codes_col)
+        codes_col_idx = df.columns.get_loc(codes_col)
+        df.iloc[list(rows), codes_col_idx] = [c for c, _ in rows.values()]
+        df.iloc[list(rows), prov_col_idx] = [p for _, p in rows.values()]
+        restored += len(rows)
+    return restored
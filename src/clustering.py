@@ -0,0 +1,96 @@
+from __future__ import annotations
+import zlib
+import numpy as np
+
+N_FEATURES = 512   # hashed dimensions; 100k distinct answers x 512 float32 = ~200 MB
+
+def hashed_tfidf(texts: list[str], n_features: int = N_FEATURES, ngram: int = 3) -> np.ndarray:
+    """
+    L2-normalised TF-IDF of character n-grams, signed-hashed into `n_features`
+    dims (float32, one row per text). CPU only; crc32 keeps hashes stable across runs.
+    """
+    vocab: dict[str, int] = {}
+    docs, grams = [], []
+    for i, t in enumerate(texts):
+        s = f" {t} "
+        for j in range(max(1, len(s) - ngram + 1)):
+            docs.append(i)
+            grams.append(vocab.setdefault(s[j:j + ngram], len(vocab)))
+
+    X = np.zeros((len(texts), n_features), dtype=np.float32)
+    if not docs:
+        return X
+    pairs, tf = np.unique(np.asarray(docs, dtype=np.int64) * len(vocab) + np.asarray(grams), return_counts=True)
+    doc, gram = pairs // len(vocab), pairs % len(vocab)
+    df = np.bincount(gram, minlength=len(vocab))
+    idf = np.log((1 + len(texts)) / (1 + df)) + 1.0
+
+    h = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in vocab), dtype=np.int64, count=len(vocab))
+    bucket = h % n_features
+    sign = np.where((h // n_features) & 1, -1.0, 1.0)
+    np.add.at(X, (doc, bucket[gram]), (sign[gram] * (1.0 + np.log(tf)) * idf[gram]).astype(np.float32))
+
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    X /= np.where(norms > 0, norms, 1.0)
+    return X
+
+def _leader_clusters(X: np.ndarray, threshold: float, block: int = 1024) -> np.ndarray:
+    """
+    One-pass leader clustering: each row joins the first cluster whose leader
+    is >= threshold similar, otherwise it starts a new cluster. Rows are handled
+    a block at a time so the similarity work is matrix products.
+    """
+    n, d = X.shape
+    assign = np.full(n, -1, dtype=np.int64)
+    leaders = np.empty((min(n, 1024), d), dtype=X.dtype)
+    k = 0
+    for start in range(0, n, block):
+        idx = np.arange(start, min(n, start + block))
+        if k:
+            sims = X[idx] @ leaders[:k].T
+            best = sims.argmax(axis=1)
+            hit = sims[np.arange(len(idx)), best] >= threshold
+            assign[idx[hit]] = best[hit]
+            idx = idx[~hit]
+        if not len(idx):
+            continue
+        inner = X[idx] @ X[idx].T
+        done = np.zeros(len(idx), dtype=bool)
+        for i in range(len(idx)):
+            if done[i]:
+                continue
+            members = ~done & (inner[i] >= threshold)
+            members[i] = True
+            assign[idx[members]] = k
+            done |= members
+            if k == len(leaders):
+                leaders = np.concatenate([leaders, np.empty_like(leaders)])
+            leaders[k] = X[idx[i]]
+            k += 1
+    return assign
+
+def cluster_representatives(texts: list[str], threshold: float, n_features: int = N_FEATURES) -> np.ndarray:
+    """
+    For each text, the index of the text whose label it should take: its
+    cluster's medoid (the member closest to the cluster centroid) when it is
+    >= threshold similar to it, else itself. Medoids and outliers map to
+    themselves and are the only ones that need coding.
+
+    Pass texts most-frequent first: early texts become cluster leaders.
+    """
+    n = len(texts)
+    if n < 2:
+        return np.arange(n)
+    X = hashed_tfidf(texts, n_features)
+    assign = _leader_clusters(X, threshold)
+
+    centroids = np.zeros((assign.max() + 1, X.shape[1]), dtype=X.dtype)
+    np.add.at(centroids, assign, X)
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    score = np.einsum("ij,ij->i", X, centroids[assign])
+    order = np.lexsort((-score, assign))               # by cluster, best member first
+    _, first = np.unique(assign[order], return_index=True)
+    medoid = order[first][assign]                      # medoid row for every row
+
+    near = np.einsum("ij,ij->i", X, X[medoid]) >= threshold
+    return np.where(near, medoid, np.arange(n))
@@ -0,0 +1,61 @@
+from __future__ import annotations
+import json
+import re
+
+_RESULTS_KEY = re.compile(r'"results"\s*:\s*$')
+
+class ResultsStream:
+    """
+    Incremental parser for a batched reply, {"results": [{...}, {...}]} or a bare
+    [{...}, ...], fed text as it arrives. feed() returns each result object as
+    soon as its closing brace is seen. Every object is parsed on its own, so a
+    reply cut off halfway still yields the rows that were complete.
+    """
+
+    def __init__(self):
+        self.text = ""            # everything fed so far
+        self._i = 0               # next character to scan
+        self._depth = 0           # current {} / [] nesting
+        self._in_str = False
+        self._esc = False
+        self._array: int | None = None   # depth inside the results array, once it opens
+        self._closed = False      # results array finished; ignore the rest
+        self._start: int | None = None   # where the current result object began
+
+    def feed(self, chunk: str) -> list[dict]:
+        self.text += chunk
+        t = self.text
+        out = []
+        for i in range(self._i, len(t)):
+            ch = t[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{" or ch == "[":
+                if ch == "{" and self._array is not None and self._depth == self._array:
+                    self._start = i
+                elif ch == "[" and self._array is None and not self._closed and (
+                        self._depth == 0 or (self._depth == 1 and _RESULTS_KEY.search(t[max(0, i - 64):i]))):
+                    self._array = self._depth + 1
+                self._depth += 1
+            elif ch == "}" or ch == "]":
+                self._depth -= 1
+                if ch == "}" and self._start is not None and self._depth == self._array:
+                    try:
+                        obj = json.loads(t[self._start:i + 1])
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        out.append(obj)
+                    self._start = None
+                elif ch == "]" and self._array is not None and self._depth == self._array - 1:
+                    self._array, self._closed = None, True
+        self._i = len(t)
+        return out
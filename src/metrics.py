@@ -0,0 +1,104 @@
+from __future__ import annotations
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+
+class Metrics:
+    """
+    Thread-safe stage timings and counters for one run.
+
+        with metrics.timer("network"): ...
+        metrics.add("retries")
+        metrics.write_report("run.report.json")
+
+    Stages reported: count, total seconds and p50/p95/p99/max latency in ms.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: dict[str, list[float]] = {}
+        self._counts: dict[str, float] = {}
+        self._questions: dict[str, dict] = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._t0 = time.perf_counter()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self._timings.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def add(self, name: str, n: float = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def count(self, name: str) -> float:
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def question(self, question: str, **fields):
+        """
+        Per-question summary (rows, seconds, ...) for the report. Numbers add up across
+        calls (one per chunk with --stream-chunksize); anything else keeps the latest
+        value. rows_per_sec is worked out from the totals.
+        """
+        with self._lock:
+            q = self._questions.setdefault(question, {})
+            for k, v in fields.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool) and isinstance(q.get(k), (int, float)):
+                    q[k] = round(q[k] + v, 3) if isinstance(v, float) else q[k] + v
+                else:
+                    q[k] = v
+            if q.get("seconds"):
+                q["rows_per_sec"] = round(q.get("rows_coded", 0) / q["seconds"], 2)
+
+    def report(self, extra: dict | None = None) -> dict:
+        with self._lock:
+            elapsed = time.perf_counter() - self._t0
+            stages = {}
+            for stage, xs in sorted(self._timings.items()):
+                a = np.asarray(xs) * 1000
+                p50, p95, p99 = np.percentile(a, [50, 95, 99])
+                stages[stage] = {
+                    "count": len(a),
+                    "total_s": round(float(a.sum()) / 1000, 3),
+                    "p50_ms": round(float(p50), 2),
+                    "p95_ms": round(float(p95), 2),
+                    "p99_ms": round(float(p99), 2),
+                    "max_ms": round(float(a.max()), 2),
+                }
+            counters = dict(self._counts)
+            questions = {q: dict(v) for q, v in self._questions.items()}
+        rows = counters.get("rows_coded", 0)
+        out = {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "elapsed_s": round(elapsed, 3),
+            "rows_coded": int(rows),
+            "rows_per_sec": round(rows / elapsed, 2) if elapsed > 0 else 0.0,
+            "counters": counters,
+            "stages": stages,
+            "questions": questions,
+        }
+        out.update(extra or {})
+        return out
+
+    def write_report(self, path: str, extra: dict | None = None) -> dict:
+        """Atomically write report() as JSON; returns it."""
+        rep = self.report(extra)
+        d = os.path.dirname(path) or "."
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+        return rep
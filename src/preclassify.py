@@ -0,0 +1,101 @@
+from __future__ import annotations
+import difflib
+import re
+from typing import Callable
+
+from src.aliases import ALIAS_MAP, NIL_ANSWERS
+from src.utils import normalise_answer
+
+NIL_LABEL = "NIL"
+
+_PUNCT = re.compile(r"[^\w+&]+")
+# "Canonical labels for this question (...): A; B; C." / "Known examples: A; B."
+_LABEL_LINE = re.compile(r"^\s*(?:canonical|known examples)[^:\n]*:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+Rule = Callable[[str], "str | None"]   # lexicon key -> codes, or None when not confident
+
+def lexicon_key(text) -> str:
+    """normalise_answer with punctuation folded to spaces: 'Scam-Shield!' -> 'scam shield'."""
+    return " ".join(_PUNCT.sub(" ", normalise_answer(text)).split())
+
+_NIL_KEYS = {lexicon_key(a) for a in NIL_ANSWERS}
+
+def parse_canonical_labels(instruction: str) -> list[str]:
+    """Labels listed on the 'Canonical ...:' / 'Known examples:' lines of an instruction."""
+    labels: list[str] = []
+    for m in _LABEL_LINE.finditer(instruction):
+        for part in m.group(1).split(";"):
+            lab = part.strip().rstrip(".").strip()
+            if lab and lab not in labels:
+                labels.append(lab)
+    return labels
+
+def nil(key: str) -> str | None:
+    """Blank / 'nil' / 'na' / 'none' / 'no' ... -> NIL."""
+    return NIL_LABEL if key in _NIL_KEYS else None
+
+class PreClassifier:
+    """
+    Local rules tried in order before an answer is sent to the LLM. A rule gets
+    the answer's lexicon_key() and returns codes when it is confident, else None;
+    the first confident rule wins and the rest of the answers go to the API.
+
+    Default rules: `nil`, `exact` (known label or alias, after case/punctuation
+    folding) and `fuzzy` (difflib ratio >= fuzzy_cutoff against a known label).
+    Pass `rules=[...]` or edit `.rules` to plug in your own.
+    """
+
+    def __init__(
+        self,
+        labels=(),
+        aliases: dict[str, str] | None = None,
+        *,
+        fuzzy_cutoff: float = 0.9,
+        rules: list[Rule] | None = None,
+    ):
+        self.aliases = dict(aliases or {})
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.lexicon: dict[str, str] = {}    # lexicon key -> label
+        self._known: dict[str, str] = {}     # casefolded label -> label as the question spells it
+        self._max_key_len = 0
+        self.add_labels(labels)
+        self.rules: list[Rule] = list(rules) if rules is not None else [nil, self.exact, self.fuzzy]
+
+    @classmethod
+    def for_instruction(cls, instruction: str, *, aliases: dict[str, str] | None = None, **kwargs) -> "PreClassifier":
+        """Lexicon = the instruction's canonical labels + ALIAS_MAP entries that point at them."""
+        return cls(parse_canonical_labels(instruction), ALIAS_MAP if aliases is None else aliases, **kwargs)
+
+    def add_labels(self, labels):
+        """Learn more labels, e.g. ones already used in the [Codes] column or the categories cache."""
+        for lab in labels:
+            bare = lab[4:] if lab[:4].upper() == "NEW:" else lab
+            key = lexicon_key(bare)
+            if key:
+                self.lexicon.setdefault(key, lab)
+                self._known.setdefault(lab.casefold(), lab)
+        # aliases only count for labels this question uses, so no foreign label sneaks in
+        for alias, target in self.aliases.items():
+            lab = self._known.get(target.casefold())
+            if lab:
+                self.lexicon.setdefault(lexicon_key(alias), lab)
+        self._max_key_len = max((len(k) for k in self.lexicon), default=0)
+
+    def exact(self, key: str) -> str | None:
+        return self.lexicon.get(key) if key else None
+
+    def fuzzy(self, key: str) -> str | None:
+        # long answers say more than a label does; leave them to the LLM
+        if len(key) < 4 or len(key) > self._max_key_len + 3:
+            return None
+        match = difflib.get_close_matches(key, self.lexicon, n=1, cutoff=self.fuzzy_cutoff)
+        return self.lexicon[match[0]] if match else None
+
+    def match(self, answer) -> tuple[str, str] | None:
+        """(codes, rule name) from the first confident rule, or None to ask the LLM."""
+        key = lexicon_key(answer)
+        for rule in self.rules:
+            codes = rule(key)
+            if codes:
+                return codes, getattr(rule, "__name__", type(rule).__name__)
+        return None
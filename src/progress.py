@@ -0,0 +1,69 @@
+from __future__ import annotations
+import sys
+import threading
+import time
+
+class ProgressBoard:
+    """
+    One combined, self-overwriting progress line for the questions being coded:
+
+        [Q1 120/300 | Q2 40/310 | Q3 done] 460/910 rows · 35.2 rows/s · ETA 0:00:12
+    """
+
+    def __init__(self, min_interval: float = 0.5, stream=None, label_width: int = 24):
+        self.min_interval = min_interval
+        self.stream = stream or sys.stderr
+        self.label_width = label_width
+        self._rows: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._last = 0.0
+        self._t0: float | None = None   # first update, for rate and ETA
+        self._done0 = 0
+
+    def reporter(self, question: str):
+        """Callback for run_categorisation_for_question(progress=...)."""
+        def _report(done: int, total: int):
+            self.update(question, done, total)
+        return _report
+
+    def logger(self, question: str):
+        """Callback for run_categorisation_for_question(log=...): prints above the bar."""
+        def _log(msg: str):
+            with self._lock:
+                self.stream.write(f"\r\033[K[{question}] {msg.strip()}\n")
+                if self._rows:
+                    self._render()
+        return _log
+
+    def update(self, question: str, done: int, total: int):
+        with self._lock:
+            now = time.monotonic()
+            if self._t0 is None:
+                self._t0, self._done0 = now, done
+            self._rows[question] = (done, total)
+            if now - self._last >= self.min_interval or done >= total:
+                self._last = now
+                self._render()
+
+    def _render(self):
+        parts = []
+        for q, (done, total) in self._rows.items():
+            label = q if len(q) <= self.label_width else q[: self.label_width - 1] + "…"
+            parts.append(f"{label} done" if done >= total else f"{label} {done}/{total}")
+        done = sum(d for d, _ in self._rows.values())
+        total = sum(t for _, t in self._rows.values())
+        line = f"[{' | '.join(parts)}] {done}/{total} rows"
+        elapsed = time.monotonic() - self._t0 if self._t0 is not None else 0.0
+        rate = (done - self._done0) / elapsed if elapsed > 0 else 0.0
+        if rate > 0:
+            eta = int((total - done) / rate)
+            line += f" · {rate:.1f} rows/s · ETA {eta // 3600}:{eta // 60 % 60:02d}:{eta % 60:02d}"
+        self.stream.write(f"\r\033[K{line}")
+        self.stream.flush()
+
+    def close(self):
+        with self._lock:
+            if self._rows:
+                self._render()
+                self.stream.write("\n")
+                self.stream.flush()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from src.utils import normalise_answer
+
+RESPONSE_CACHE_FILE = "responses_cache.sqlite"
+
+class ResponseCache:
+    """
+    Persistent answer -> codes cache backed by SQLite.
+
+    Keys are a hash of (question, instruction, model, normalised answer[, labels
+    version]), so an edited instruction, a different model or a bumped labels
+    version never reuses old codes. When the table grows past `max_entries`,
+    the least recently used tenth is evicted.
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_FILE, max_entries: int = 200_000, commit_every: int = 200):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.commit_every = max(1, commit_every)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._tick = 0          # LRU clock; bumped on every get/put
+        self._uncommitted = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, codes TEXT NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses(used)")
+        row = self._db.execute("SELECT COUNT(*), COALESCE(MAX(used), 0) FROM responses").fetchone()
+        self._count, self._tick = int(row[0]), int(row[1])
+
+    @staticmethod
+    def make_key(question: str, instruction: str, model: str, answer, labels_version: str = "") -> str:
+        parts = [str(question), str(instruction), str(model), normalise_answer(answer)]
+        if labels_version:   # left out when unset, so existing caches keep their keys
+            parts.append(str(labels_version))
+        raw = json.dumps(parts, ensure_ascii=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT codes FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tick += 1
+            self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (self._tick, key))
+            self._maybe_commit()
+            return row[0]
+
+    def put(self, key: str, codes: str):
+        if not codes:
+            return
+        with self._lock:
+            self._tick += 1
+            self._db.execute(
+                "INSERT INTO responses(key, codes, used) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET codes = excluded.codes, used = excluded.used",
+                (key, codes, self._tick),
+            )
+            self._count += 1   # over-counts upserts; _evict recounts before deleting
+            if self._count > self.max_entries:
+                self._evict()
+            self._maybe_commit()
+
+    def merge_from(self, path: str) -> int:
+        """Copy entries from another cache file that this one lacks; returns how many were added."""
+        if not os.path.exists(path) or os.path.abspath(path) == os.path.abspath(self.path):
+            return 0
+        with self._lock:
+            self._db.commit()
+            self._db.execute("ATTACH DATABASE ? AS other", (path,))
+            try:
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO responses(key, codes, used) SELECT key, codes, ? FROM other.responses",
+                    (self._tick,),
+                )
+                added = max(0, cur.rowcount)
+                self._db.commit()
+            finally:
+                self._db.execute("DETACH DATABASE other")
+            self._count += added
+            if self._count > self.max_entries:
+                self._evict()
+                self._db.commit()
+        return added
+
+    def _evict(self):
+        self._count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if self._count <= self.max_entries:
+            return
+        keep = int(self.max_entries * 0.9)
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used ASC LIMIT ?)",
+            (self._count - keep,),
+        )
+        self._count = keep
+
+    def _maybe_commit(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def flush(self):
+        with self._lock:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": self._count,
+        }
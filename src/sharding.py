@@ -0,0 +1,164 @@
+from __future__ import annotations
+import os
+import numpy as np
+import pandas as pd
+
+from src.categories_cache import CACHE_FILE, CategoriesCache
+from src.categoriser import _seed_categories_from_df, get_or_create_codes_column, get_or_create_provenance_column
+from src.response_cache import ResponseCache
+from src.utils import iter_table_chunks, load_table, normalise_answer, table_format
+
+SHARD_READ_ROWS = 200_000   # rows per chunk when picking one shard's rows out of a CSV/Parquet input
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """'2/8' -> (2, 8); shards are numbered 0..N-1."""
+    try:
+        i, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"--shard must look like i/N (e.g. 0/4), got {spec!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"--shard {spec}: need N >= 1 and 0 <= i < N")
+    return i, n
+
+def shard_path(path: str, i: int, n: int) -> str:
+    """'out.csv' -> 'out.shard-2-of-8.csv', for every per-shard file (output, caches)."""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.shard-{i}-of-{n}{ext}"
+
+def id_dtype(id_col: str | None) -> dict | None:
+    """
+    Read the ID column as text everywhere. Left to guess, pandas makes a CSV chunk
+    holding one blank ID float, and its IDs would then hash as '5.0' instead of '5'.
+    """
+    return {id_col: str} if id_col else None
+
+def _id_keys(ids: pd.Series) -> pd.Series:
+    """IDs as the strings that get hashed and compared; missing IDs all become ''."""
+    return ids.astype(object).where(ids.notna(), "").astype(str)
+
+def shard_of(ids: pd.Series, n: int) -> np.ndarray:
+    """Shard number of every row ID. Stable across processes and runs (unlike hash())."""
+    h = pd.util.hash_pandas_object(_id_keys(ids), index=False).to_numpy()
+    return (h % np.uint64(n)).astype(np.int64)
+
+def _row_ids(df: pd.DataFrame, id_col: str | None, offset: int) -> pd.Series:
+    if id_col:
+        return df[id_col]
+    return pd.Series(np.arange(offset, offset + len(df)))   # row position in the input
+
+def load_shard(path: str, i: int, n: int, *, id_col: str | None = None, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Rows of shard i/N, in input order. Rows are assigned by a hash of `id_col`
+    (or of the row position when there is none), so every worker agrees on the
+    split without talking to the others. CSV/Parquet inputs are read in chunks,
+    so a worker only ever holds its own rows plus one chunk.
+    """
+    if table_format(path) not in ("csv", "parquet"):
+        df = load_table(path, columns=columns, dtype=id_dtype(id_col))
+        return df[shard_of(_row_ids(df, id_col, 0), n) == i].reset_index(drop=True)
+    parts, offset = [], 0
+    for chunk in iter_table_chunks(path, SHARD_READ_ROWS, columns, dtype=id_dtype(id_col)):
+        parts.append(chunk[shard_of(_row_ids(chunk, id_col, offset), n) == i])
+        offset += len(chunk)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+
+# ----- merge -----
+
+def reconcile_labels(label_lists: list[list[str]]) -> tuple[list[str], dict[str, str]]:
+    """
+    Union label lists that may spell the same label differently ('Scam Awareness'
+    vs 'scam awareness'). The first spelling seen wins; returns the merged list
+    and a {spelling: canonical} map for every other spelling.
+    """
+    canon: dict[str, str] = {}
+    renames: dict[str, str] = {}
+    for labels in label_lists:
+        for lab in labels:
+            key = normalise_answer(lab)
+            if not key:
+                continue
+            first = canon.setdefault(key, lab)
+            if lab != first:
+                renames[lab] = first
+    return list(canon.values()), renames
+
+def rename_labels(col: pd.Series, renames: dict[str, str]) -> pd.Series:
+    """Apply `renames` inside '; '-joined code cells (each distinct cell is rewritten once)."""
+    if not renames:
+        return col
+    cells = col.dropna().astype(str)
+    fixed = {}
+    for cell in pd.unique(cells):
+        parts = [p.strip() for p in cell.split(";") if p.strip()]
+        new = list(dict.fromkeys(renames.get(p, p) for p in parts))
+        if new != parts:
+            fixed[cell] = "; ".join(new)
+    if not fixed:
+        return col
+    return col.map(lambda v: fixed.get(v, v) if isinstance(v, str) else v)
+
+def merge_shards(
+    df: pd.DataFrame,
+    specs: list[dict],
+    output_path: str,
+    n: int,
+    *,
+    id_col: str | None = None,
+    categories_cache: str = CACHE_FILE,
+    response_cache: ResponseCache | None = None,
+    log=print,
+) -> int:
+    """
+    Fill df (the full input, read with dtype=id_dtype(id_col)) from the N shard outputs of `output_path`, union the
+    shards' categories caches into `categories_cache` (reconciling labels that
+    differ only in case/spacing, and renaming them in the codes too) and the
+    shards' response caches into `response_cache`. Returns labels renamed.
+    """
+    paths = [shard_path(output_path, i, n) for i in range(n)]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError("Missing shard outputs (run those shards first): " + ", ".join(missing))
+
+    which = shard_of(_row_ids(df, id_col, 0), n)
+    cols = {}   # question -> (codes col, provenance col)
+    for spec in specs:
+        q = spec["question_col"]
+        codes_col, _, _ = get_or_create_codes_column(df, q)
+        prov_col, _ = get_or_create_provenance_column(df, q, codes_col)
+        cols[q] = (codes_col, prov_col)
+
+    for i, path in enumerate(paths):
+        part = load_table(path, dtype=id_dtype(id_col))
+        rows = np.flatnonzero(which == i)
+        if len(part) != len(rows) or (id_col and id_col in part.columns
+                                      and not (_id_keys(part[id_col]).to_numpy()
+                                               == _id_keys(df[id_col].iloc[rows]).to_numpy()).all()):
+            raise ValueError(f"{path} does not match shard {i}/{n} of the input; "
+                             "was it made from another input file or --id-col?")
+        for codes_col, prov_col in cols.values():
+            for col in (codes_col, prov_col):
+                if col in part.columns:
+                    df.iloc[rows, df.columns.get_loc(col)] = part[col].astype(object).to_numpy()
+        log(f"   Shard {i}/{n}: {len(rows)} rows from {path}")
+
+    cache = CategoriesCache(categories_cache)
+    shard_caches = [CategoriesCache(shard_path(categories_cache, i, n)) for i in range(n)]
+    renamed = 0
+    for q, (codes_col, _) in cols.items():
+        codes_idx = df.columns.get_loc(codes_col)
+        labels, renames = reconcile_labels(
+            [cache.get(q)] + [c.get(q) for c in shard_caches] + [_seed_categories_from_df(df, codes_idx)]
+        )
+        df[codes_col] = rename_labels(df[codes_col], renames)
+        cache.update(q, labels)
+        renamed += len(renames)
+        if renames:
+            log(f"   {q}: merged {', '.join(f'{a!r} -> {b!r}' for a, b in renames.items())}")
+    cache.flush()
+
+    if response_cache is not None:
+        for i in range(n):
+            added = response_cache.merge_from(shard_path(response_cache.path, i, n))
+            if added:
+                log(f"   Response cache: +{added} answers from shard {i}/{n}")
+    return renamed
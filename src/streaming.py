@@ -0,0 +1,101 @@
+from __future__ import annotations
+import json
+import os
+import tempfile
+from typing import Callable
+import pandas as pd
+
+from src.checkpoint import CheckpointJournal, replay_journal
+from src.utils import iter_table_chunks
+
+def _load_state(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _save_state(path: str, state: dict):
+    """Atomic write of the small resume sidecar."""
+    d = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def stream_code_csv(
+    input_path: str,
+    output_path: str,
+    *,
+    chunksize: int,
+    code_chunk: Callable[[pd.DataFrame, CheckpointJournal, int], None],
+    journal_path: str,
+    sync_interval: float = 5.0,
+    columns: list[str] | None = None,
+    dtype: dict | None = None,
+    log=print,
+) -> int:
+    """
+    Code a CSV (or Parquet) input in row chunks so memory stays bounded by
+    `chunksize`, not file size. The output is always CSV. `columns` projects
+    the read to just those input columns; `dtype` pins column types that must
+    read the same in every chunk.
+
+    Each chunk is read, has the journal replayed onto it, is coded by
+    `code_chunk(chunk, journal, row_offset)`, and is appended to `output_path`.
+    A sidecar `<output>.progress.json` records how many input rows and output
+    bytes are complete; on restart the output is cut back to that size, finished
+    chunks are skipped, and the journal restores rows of the chunk in progress.
+    Returns the number of rows written.
+    """
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise ValueError("Streaming mode appends to --output, so it must differ from --input.")
+
+    state_path = f"{output_path}.progress.json"
+    state = _load_state(state_path)
+    rows_done = int(state.get("rows_done", 0))
+    if rows_done and os.path.exists(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(int(state["bytes"]))   # drop a chunk that was half-appended
+        log(f"↺ Resuming after {rows_done} rows already in {output_path}")
+    else:
+        rows_done = 0
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    journal = CheckpointJournal(journal_path, sync_interval=sync_interval)
+    offset = 0
+    try:
+        for chunk in iter_table_chunks(input_path, max(1, chunksize), columns, dtype=dtype):
+            n = len(chunk)
+            if offset + n <= rows_done:
+                offset += n
+                continue
+            chunk = chunk.reset_index(drop=True)
+            if offset < rows_done:   # chunk size changed between runs
+                chunk = chunk.iloc[rows_done - offset:].reset_index(drop=True)
+                offset = rows_done
+                n = len(chunk)
+
+            restored = replay_journal(chunk, journal_path, row_offset=offset)
+            if restored:
+                log(f"↺ Restored {restored} coded rows from {journal_path}")
+            log(f"▶ Rows {offset}–{offset + n - 1}")
+            code_chunk(chunk, journal, offset)
+
+            with open(output_path, "a", encoding="utf-8", newline="") as f:
+                chunk.to_csv(f, index=False, header=(offset == 0))
+                f.flush()
+                os.fsync(f.fileno())
+            offset += n
+            _save_state(state_path, {"rows_done": offset, "bytes": os.path.getsize(output_path)})
+            journal.truncate()   # this chunk is in the output now
+    finally:
+        journal.close()
+
+    journal.close(remove=True)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return offset
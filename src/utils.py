@@ -7,20 +7,106 @@ import pandas as pd
 
 _ZW = re.compile(r"[\u200B-\u200D\u2060\uFEFF]")  # zero-width/format chars
 
+EXCEL_EXTS   = (".xlsx", ".xls")
+PARQUET_EXTS = (".parquet", ".pq")
+FEATHER_EXTS = (".feather", ".arrow")
+
+def table_format(path: str) -> str:
+    """'csv' | 'excel' | 'parquet' | 'feather', from the file extension."""
+    p = path.lower()
+    if p.endswith(EXCEL_EXTS):
+        return "excel"
+    if p.endswith(PARQUET_EXTS):
+        return "parquet"
+    if p.endswith(FEATHER_EXTS):
+        return "feather"
+    return "csv"
+
+def _require_pyarrow(path: str):
+    """pyarrow is optional; only Parquet/Feather files need it."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f"{path}: Parquet/Feather support needs pyarrow (pip install pyarrow).") from None
+
+def read_columns(path: str, sheet=None) -> list[str]:
+    """Column names only, without loading any rows."""
+    fmt = table_format(path)
+    if fmt == "parquet":
+        _require_pyarrow(path)
+        import pyarrow.parquet as pq
+        return [c for c in pq.read_schema(path).names if not c.startswith("__index_level_")]
+    if fmt == "feather":
+        _require_pyarrow(path)
+        import pyarrow as pa
+        with pa.memory_map(path) as src:
+            return list(pa.ipc.open_file(src).schema.names)
+    if fmt == "excel":
+        return list(pd.read_excel(path, sheet_name=sheet or 0, nrows=0).columns)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def load_table(path: str, columns: list[str] | None = None, sheet=None, dtype: dict | None = None) -> pd.DataFrame:
+    """
+    Load CSV/Excel/Parquet/Feather by extension. `columns` projects the read so
+    only those columns are parsed (Parquet/Feather skip the rest on disk).
+    `dtype` pins CSV/Excel column types instead of letting pandas guess them
+    (Parquet/Feather store theirs).
+    """
+    fmt = table_format(path)
+    if fmt in ("parquet", "feather"):
+        _require_pyarrow(path)
+        if fmt == "parquet":
+            return pd.read_parquet(path, columns=columns)
+        return pd.read_feather(path, columns=columns)
+    if fmt == "excel":
+        return pd.read_excel(path, sheet_name=sheet or 0, usecols=columns, dtype=dtype)
+    return pd.read_csv(path, usecols=columns, dtype=dtype)
+
+def iter_table_chunks(path: str, chunksize: int, columns: list[str] | None = None, dtype: dict | None = None):
+    """
+    Yield DataFrames of at most `chunksize` rows from a CSV or Parquet file.
+    Pass `dtype` for CSV columns whose type must not change from chunk to chunk.
+    """
+    fmt = table_format(path)
+    if fmt == "parquet":
+        _require_pyarrow(path)
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        try:
+            for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        finally:
+            pf.close()
+        return
+    if fmt != "csv":
+        raise ValueError(f"{path}: chunked reading needs a CSV or Parquet file.")
+    yield from pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype=dtype)
+
 def atomic_save_df(df: pd.DataFrame, path: str):
-    """Atomic write so you never leave a half-written CSV."""
+    """Atomic write (format from the extension) so you never leave a half-written file."""
+    fmt = table_format(path)
+    if fmt in ("parquet", "feather"):
+        _require_pyarrow(path)
     d = os.path.dirname(path) or "."
-    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp" + os.path.splitext(path)[1])   # Excel writers check the extension
     os.close(fd)
     try:
-        df.to_csv(tmp, index=False)
+        if fmt == "parquet":
+            df.to_parquet(tmp, index=False)
+        elif fmt == "feather":
+            df.reset_index(drop=True).to_feather(tmp)
+        elif fmt == "excel":
+            df.to_excel(tmp, index=False, engine="openpyxl")
+        else:
+            df.to_csv(tmp, index=False)
         os.replace(tmp, path)
     finally:
         if os.path.exists(tmp):
             try: os.remove(tmp)
             except: pass
 
-def make_content(instructions: str, question: str, answer, categories: list[str]) -> str:
+def clean_answer(answer) -> str:
+    """Normalise quotes/spaces and strip zero-width & non-printable chars."""
     if answer is None or (isinstance(answer, float) and math.isnan(answer)):
         ans = ""
     else:
@@ -31,13 +117,27 @@ def make_content(instructions: str, question: str, answer, categories: list[str]
               .replace("\u201c", '"').replace("\u201d", '"')
               .replace("\u00A0", " "))
     ans = _ZW.sub("", ans)
-    ans = "".join(ch for ch in ans if ch.isprintable())
+    return "".join(ch for ch in ans if ch.isprintable())
+
+def normalise_answer(answer) -> str:
+    """clean_answer + casefold + collapsed whitespace; equal outputs mean 'same answer'."""
+    return " ".join(clean_answer(answer).casefold().split())
 
-    return json.dumps(
-        {"instructions": str(instructions), "question": str(question), "answer": ans, "categories": list(categories)},
-        ensure_ascii=True,
-        separators=(",", ":"),
-    )
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 chars per token); good enough for budgeting."""
+    return len(text) // 4 + 1
+
+SESSION_NOTE = (
+    "This chat codes many answers. Later messages send only the next answer(s), plus "
+    "'new_categories' when labels are added; keep following these instructions and reply in the same format."
+)
+
+def make_content(instructions: str, question: str, answer, categories: list[str], session_note: bool = False) -> str:
+    ans = clean_answer(answer)
+    payload = {"instructions": str(instructions), "question": str(question), "answer": ans, "categories": list(categories)}
+    if session_note:
+        payload["session"] = SESSION_NOTE
+    return json.dumps(payload, ensure_ascii=True, separators=(",", ":"))
 
 def load_questions_config(path_or_list):
     """Accept either a path to JSON config or a Python list of dicts."""
@@ -46,25 +146,14 @@ def load_questions_config(path_or_list):
             return json.load(f)
     return path_or_list
 
-def make_batch_content(instructions: str, question: str, items: list[dict], categories: list[str]) -> str:
+def make_batch_content(instructions: str, question: str, items: list[dict], categories: list[str],
+                       session_note: bool = False) -> str:
     """
     items = [{"row": <int>, "answer": <str>}]
     Returns a JSON string instructing the model to ONLY reply with:
       {"results":[{"row":<int>,"categories":"Label1; Label2"}]}
     """
-    # sanitize answers
-    def _clean(a):
-        if a is None or (isinstance(a, float) and math.isnan(a)):
-            a = ""
-        a = str(a)
-        a = (a.replace("\u2019", "'").replace("\u2018", "'")
-               .replace("\u201c", '"').replace("\u201d", '"')
-               .replace("\u00A0", " "))
-        a = _ZW.sub("", a)
-        a = "".join(ch for ch in a if ch.isprintable())
-        return a
-
-    clean_items = [{"row": it["row"], "answer": _clean(it.get("answer", ""))} for it in items]
+    clean_items = [{"row": it["row"], "answer": clean_answer(it.get("answer", ""))} for it in items]
 
     payload = {
         "instructions": str(instructions),
@@ -78,4 +167,16 @@ def make_batch_content(instructions: str, question: str, items: list[dict], cate
             " — no prose, no markdown, no extra keys."
         )
     }
+    if session_note:
+        payload["session"] = SESSION_NOTE
+    return json.dumps(payload, ensure_ascii=True, separators=(",", ":"))
+
+def make_followup_content(new_categories: list[str], *, answer=None, items: list[dict] | None = None) -> str:
+    """Compact message for a chat that already has the instructions: answer(s) + labels it has not seen."""
+    if items is not None:
+        payload = {"items": [{"row": it["row"], "answer": clean_answer(it.get("answer", ""))} for it in items]}
+    else:
+        payload = {"answer": clean_answer(answer)}
+    if new_categories:
+        payload["new_categories"] = list(new_categories)
     return json.dumps(payload, ensure_ascii=True, separators=(",", ":"))